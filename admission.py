@@ -0,0 +1,81 @@
+"""
+Connection Admission
+
+Keeps a reconnect storm (server restart, Wi-Fi blip) from arriving all
+at once:
+- Token bucket: `rate` connects per second, bursts of up to `burst`
+- A refused client is handed the next free slot of a virtual queue that
+  drains at `rate`, plus jitter, as its retry_after; a herd of N
+  clients comes back spread over about N / rate seconds instead of in
+  another wave
+- A burst starts with the first refusal after a quiet period and ends
+  once the queue has drained, so bursts can be counted and logged
+"""
+import random
+import threading
+import time
+
+DEFAULT_RATE = 50.0
+DEFAULT_BURST = 100
+DEFAULT_MIN_RETRY = 1.0
+DEFAULT_MAX_RETRY = 30.0
+RETRY_JITTER = 0.25
+
+
+class ConnectLimiter:
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_retry=DEFAULT_MIN_RETRY,
+                 max_retry=DEFAULT_MAX_RETRY, on_burst=None):
+        self.rate = rate
+        self.burst = burst
+        self.min_retry = min_retry
+        self.max_retry = max_retry
+        self.on_burst = on_burst  # called with True when a burst starts, False when it ends
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+        self.in_burst = False
+        self.admitted = 0
+        self.refused = 0
+        self.bursts = 0
+
+    def admit(self, now=None):
+        """None if the connection may proceed, else the seconds the client should wait"""
+        now = time.monotonic() if now is None else now
+        wait = None
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            started = ended = False
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self.admitted += 1
+                if self.in_burst and now >= self._next_slot:
+                    self.in_burst, ended = False, True
+            else:
+                self.refused += 1
+                if not self.in_burst:
+                    self.in_burst = started = True
+                    self.bursts += 1
+                # Next free slot of the virtual queue, at least min_retry out
+                self._next_slot = min(max(now + self.min_retry, self._next_slot) + 1.0 / self.rate,
+                                      now + self.max_retry)
+                wait = self._next_slot - now
+        if self.on_burst and (started or ended):
+            self.on_burst(started)
+        if wait is None:
+            return None
+        return wait * random.uniform(1.0 - RETRY_JITTER, 1.0 + RETRY_JITTER)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'admitted': self.admitted,
+                'refused': self.refused,
+                'bursts': self.bursts,
+                'in_burst': self.in_burst,
+                'backlog_seconds': max(0.0, self._next_slot - now),
+                'rate': self.rate,
+                'burst': self.burst,
+            }
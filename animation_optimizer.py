@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Animation Optimizer
+
+Post-export pass over a Blender glTF that shrinks the animation data:
+- Constant tracks are collapsed to one key, or removed when they only
+  hold the node's rest pose
+- Curves are simplified (Douglas-Peucker on linear keys) within a
+  per-channel error tolerance
+- Rotations are stored as normalized int16 quaternions, translations
+  are snapped to a fixed grid
+- Prints a before/after byte report per clip
+
+Usage: python animation_optimizer.py web_assets/npc.gltf [more.gltf ...]
+"""
+import sys
+from gltf_tools import Gltf, COMPONENT_SIZES, TYPE_SIZES
+
+# Max absolute error per component, in the channel's own units
+DEFAULT_TOLERANCES = {
+    "rotation": 0.0005,     # quaternion components
+    "translation": 0.005,   # Mixamo rigs are in centimeters
+    "scale": 0.0005,
+    "weights": 0.001,
+}
+
+# Translation grid step (same units as the tolerances)
+TRANSLATION_STEP = 0.001
+
+REST_POSE = {
+    "rotation": (0.0, 0.0, 0.0, 1.0),
+    "translation": (0.0, 0.0, 0.0),
+    "scale": (1.0, 1.0, 1.0),
+}
+
+SHORT = 5122
+FLOAT = 5126
+
+
+def _keys(values, components):
+    return [tuple(values[i:i + components]) for i in range(0, len(values), components)]
+
+
+def _close(a, b, tolerance):
+    return all(abs(x - y) <= tolerance for x, y in zip(a, b))
+
+
+def _continuous_quaternions(keys):
+    """Flip quaternions onto one hemisphere so neighbouring keys interpolate cleanly"""
+    out = [keys[0]]
+    for q in keys[1:]:
+        if sum(a * b for a, b in zip(out[-1], q)) < 0:
+            q = tuple(-c for c in q)
+        out.append(q)
+    return out
+
+
+def simplify(times, keys, tolerance):
+    """Indices of the keys to keep so linear interpolation stays within tolerance"""
+    keep = {0, len(keys) - 1}
+    stack = [(0, len(keys) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        t0, t1 = times[first], times[last]
+        v0, v1 = keys[first], keys[last]
+        span = (t1 - t0) or 1.0
+        worst, worst_error = None, tolerance
+        for i in range(first + 1, last):
+            f = (times[i] - t0) / span
+            error = max(abs(a + (b - a) * f - c) for a, b, c in zip(v0, v1, keys[i]))
+            if error > worst_error:
+                worst, worst_error = i, error
+        if worst is not None:
+            keep.add(worst)
+            stack.append((first, worst))
+            stack.append((worst, last))
+    return sorted(keep)
+
+
+def _accessor_size(gltf, index):
+    accessor = gltf.accessors[index]
+    return accessor['count'] * COMPONENT_SIZES[accessor['componentType']] * TYPE_SIZES[accessor['type']]
+
+
+def _clip_size(gltf, animation):
+    used = {index for sampler in animation['samplers'] for index in (sampler['input'], sampler['output'])}
+    return sum(_accessor_size(gltf, index) for index in used)
+
+
+def optimize_clip(gltf, animation, tolerances, quantize=True):
+    """Rewrite one animation in place"""
+    nodes = gltf.json['nodes']
+    channels, samplers = [], []
+    time_accessors = {}
+
+    for channel in animation['channels']:
+        sampler = animation['samplers'][channel['sampler']]
+        path = channel['target']['path']
+        if sampler.get('interpolation', 'LINEAR') != 'LINEAR':
+            # Cubic/step curves are kept as exported
+            channel['sampler'] = len(samplers)
+            channels.append(channel)
+            samplers.append(sampler)
+            continue
+
+        times, _ = gltf.read_accessor(sampler['input'])
+        values, components = gltf.read_accessor(sampler['output'])
+        keys = _keys(values, len(values) // len(times) if path == 'weights' else components)
+        if path == 'rotation':
+            keys = _continuous_quaternions(keys)
+        tolerance = tolerances.get(path, 0.0)
+
+        if all(_close(key, keys[0], tolerance) for key in keys):
+            node = nodes[channel['target']['node']]
+            rest = node.get(path, REST_POSE.get(path))
+            if 'matrix' not in node and rest is not None and _close(keys[0], rest, tolerance):
+                continue
+            kept = [0]
+        else:
+            kept = simplify(list(times), keys, tolerance)
+        times = [times[i] for i in kept]
+        keys = [keys[i] for i in kept]
+
+        # Channels of one clip usually end up with the same key times
+        time_key = tuple(times)
+        if time_key not in time_accessors:
+            time_accessors[time_key] = gltf.add_accessor(times, 'SCALAR', FLOAT, bounds=True)
+        flat = [c for key in keys for c in key]
+        output_type = gltf.accessors[sampler['output']]['type']
+        if quantize and path == 'rotation':
+            flat = [round(max(-1.0, min(1.0, c)) * 32767) for c in flat]
+            output = gltf.add_accessor(flat, output_type, SHORT, normalized=True)
+        else:
+            if quantize and path == 'translation':
+                flat = [round(c / TRANSLATION_STEP) * TRANSLATION_STEP for c in flat]
+            output = gltf.add_accessor(flat, output_type, FLOAT)
+
+        channel['sampler'] = len(samplers)
+        channels.append(channel)
+        samplers.append({'input': time_accessors[time_key], 'interpolation': 'LINEAR', 'output': output})
+
+    animation['channels'] = channels
+    animation['samplers'] = samplers
+
+
+def optimize_animations(gltf_path, tolerances=None, quantize=True):
+    """Optimize every clip of a glTF file in place, returns the per-clip report"""
+    tolerances = dict(DEFAULT_TOLERANCES, **(tolerances or {}))
+    gltf = Gltf(gltf_path)
+    report = []
+    for animation in gltf.json.get('animations', []):
+        before = (_clip_size(gltf, animation), len(animation['channels']))
+        optimize_clip(gltf, animation, tolerances, quantize)
+        after = (_clip_size(gltf, animation), len(animation['channels']))
+        report.append({
+            'clip': animation.get('name', '?'),
+            'bytes_before': before[0],
+            'bytes_after': after[0],
+            'channels_before': before[1],
+            'channels_after': after[1],
+        })
+    gltf.save(gltf_path, binary_name=gltf.json['buffers'][0].get('uri') if gltf.json.get('buffers') else None)
+    return report
+
+
+def print_report(report):
+    """Before/after byte report per clip"""
+    print("🎬 Animation optimization:")
+    total_before = total_after = 0
+    for clip in report:
+        before, after = clip['bytes_before'], clip['bytes_after']
+        total_before += before
+        total_after += after
+        saved = 100 * (1 - after / before) if before else 0
+        print(f"   {clip['clip']}: {before:,} -> {after:,} bytes (-{saved:.0f}%), "
+              f"{clip['channels_before']} -> {clip['channels_after']} channels")
+    if total_before:
+        print(f"   total: {total_before:,} -> {total_after:,} bytes (-{100 * (1 - total_after / total_before):.0f}%)")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        print(f"📦 {path}")
+        print_report(optimize_animations(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Asset Server
+
+Serves the 3D model assets with:
+- gzip/brotli variants built once per file version and stored on disk
+- Accept-Encoding negotiation (br > gzip > identity)
+- Strong ETags and 304 answers for conditional requests
+- Byte ranges (206) for every representation
+- A manifest of content-hashed names (npc.<hash>.gltf) built from the
+  files on disk; fingerprinted URLs are served immutable (cached for a
+  year), and glTF files get their buffer/image URIs rewritten to the
+  fingerprinted names so every dependency is versioned too
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+from pathlib import Path
+from urllib.parse import quote, unquote
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+from gltf_tools import rewrite_uris
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Formats that are already compressed (PNG, JPEG, ...) are served as-is
+COMPRESSIBLE_SUFFIXES = {'.gltf', '.glb', '.bin', '.json', '.js', '.css', '.html', '.svg', '.txt'}
+
+# A variant is only used if it saves at least this fraction of the original
+MIN_SAVING = 0.05
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+FINGERPRINT_LENGTH = 12
+FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<suffix>\.[^./]+)$' % FINGERPRINT_LENGTH)
+GLTF_SUFFIXES = ('.gltf', '.glb')
+
+# Served through per-client negotiation (Accept, cookies), so one URL is not one file
+UNVERSIONED_DIRS = ('textures/',)
+
+log = logging.getLogger("plant.assets")
+
+mimetypes.add_type('model/gltf+json', '.gltf')
+mimetypes.add_type('model/gltf-binary', '.glb')
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class AssetServer:
+    def __init__(self, directory, cache_dir, max_age=3600):
+        self.directory = Path(directory)
+        self.cache_dir = Path(cache_dir)
+        self.max_age = max_age
+        self.encoders = {'gzip': _gzip}
+        if brotli is not None:
+            self.encoders = {'br': _brotli, 'gzip': _gzip}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_lock = threading.Lock()
+
+    def entry(self, path):
+        """Version info and compressed variants for a file, rebuilt when it changes"""
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(path)
+        if entry and entry['version'] == version:
+            return entry
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry['version'] == version:
+                return entry
+            entry = self._build(path, version)
+            self._entries[path] = entry
+        return entry
+
+    def _build(self, path, version):
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:20]
+        entry = {'version': version, 'etag': digest, 'mtime': version[0] / 1e9, 'variants': {}}
+        if path.suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+            return entry
+
+        for encoding, encode in self.encoders.items():
+            variant = self.cache_dir / f"{path.name}.{digest}.{encoding}"
+            if not variant.exists():
+                compressed = encode(data)
+                if len(compressed) > len(data) * (1 - MIN_SAVING):
+                    continue
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp = variant.with_suffix(f".tmp{os.getpid()}")
+                tmp.write_bytes(compressed)
+                tmp.replace(variant)
+                log.info("🗜️  %s: %s -> %s bytes (%s)", path.name, f"{len(data):,}", f"{len(compressed):,}", encoding)
+            entry['variants'][encoding] = variant
+        return entry
+
+    def warm(self):
+        """Build variants for every asset and the manifest up front"""
+        for path in sorted(self.directory.rglob('*')):
+            if path.is_file() and not path.name.startswith('.'):
+                self.entry(path)
+        for path in self.manifest()['files'].values():
+            self.entry(path)
+
+    # Fingerprinted names
+
+    def _versioned_files(self):
+        files = {}
+        for path in sorted(self.directory.rglob('*')):
+            name = path.relative_to(self.directory).as_posix()
+            if (path.is_file() and '.' in path.name and not name.startswith(UNVERSIONED_DIRS)
+                    and not any(part.startswith('.') for part in Path(name).parts)):
+                files[name] = path
+        return files
+
+    def manifest(self):
+        """{'names': asset -> fingerprinted name, 'files': fingerprinted name -> file to serve,
+        'dependencies': glTF -> assets it references}, rebuilt when the files change"""
+        files = self._versioned_files()
+        signature = tuple((name, path.stat().st_mtime_ns, path.stat().st_size) for name, path in files.items())
+        manifest = self._manifest
+        if manifest and manifest['signature'] == signature:
+            return manifest
+        with self._manifest_lock:
+            if self._manifest and self._manifest['signature'] == signature:
+                return self._manifest
+            manifest = self._build_manifest(files)
+            manifest['signature'] = signature
+            self._manifest = manifest
+        return manifest
+
+    def _build_manifest(self, files):
+        names, served, dependencies = {}, {}, {}
+
+        def add(name, path, digest):
+            stem, suffix = posixpath.splitext(name)
+            if posixpath.basename(stem).startswith(digest[:FINGERPRINT_LENGTH]):
+                # Already named by its content (shared_library.py chunks)
+                fingerprinted = name
+            else:
+                fingerprinted = f"{stem}.{digest[:FINGERPRINT_LENGTH]}{suffix}"
+            names[name] = fingerprinted
+            served[fingerprinted] = path
+
+        # Plain files first, a glTF's hash then covers the versions of what it references
+        for name, path in files.items():
+            if path.suffix.lower() not in GLTF_SUFFIXES:
+                add(name, path, self.entry(path)['etag'])
+        for name, path in files.items():
+            if path.suffix.lower() not in GLTF_SUFFIXES:
+                continue
+            folder = posixpath.dirname(name)
+            used = []
+
+            def rename(uri):
+                target = posixpath.normpath(posixpath.join(folder, unquote(uri)))
+                if target not in names:
+                    return None
+                used.append(target)
+                return quote(posixpath.relpath(names[target], folder or '.'))
+
+            data = path.read_bytes()
+            rewritten = rewrite_uris(data, rename)
+            digest = hashlib.sha256(rewritten).hexdigest()
+            if rewritten is not data:
+                # Content-addressed, so concurrent builders write the same bytes
+                path = self.cache_dir / f"{digest[:20]}{path.suffix.lower()}"
+                if not path.exists():
+                    self.cache_dir.mkdir(parents=True, exist_ok=True)
+                    tmp = path.with_suffix(f".tmp{os.getpid()}")
+                    tmp.write_bytes(rewritten)
+                    tmp.replace(path)
+            add(name, path, digest)
+            dependencies[name] = used
+        return {'names': names, 'files': served, 'dependencies': dependencies}
+
+    def send(self, filename, immutable=False):
+        """Response for one asset, negotiated against the current request
+
+        Fingerprinted names of the current versions are served immutable,
+        outdated ones fall back to the current file with the normal max age."""
+        resolved = safe_join(str(self.directory), filename)
+        if resolved is None or not os.path.isfile(resolved):
+            match = FINGERPRINTED.match(filename)
+            if not match:
+                abort(404)
+            manifest = self.manifest()
+            if filename in manifest['files']:
+                return self._send(manifest['files'][filename], immutable=True)
+            return self.send(match['stem'] + match['suffix'])
+        path = Path(resolved)
+        manifest = self._manifest
+        return self._send(path, immutable or bool(manifest and manifest['files'].get(filename) == path))
+
+    def _send(self, path, immutable=False):
+        entry = self.entry(path)
+        mimetype = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+
+        encoding = None
+        for candidate in entry['variants']:
+            if request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        if encoding is None:
+            response = send_file(path, mimetype=mimetype, conditional=True, etag=entry['etag'],
+                                 last_modified=entry['mtime'], max_age=self.max_age)
+        else:
+            # Each representation needs its own strong ETag
+            response = send_file(entry['variants'][encoding], mimetype=mimetype, conditional=True,
+                                 etag=f"{entry['etag']}-{encoding}", last_modified=entry['mtime'],
+                                 max_age=self.max_age)
+            response.headers['Content-Encoding'] = encoding
+        if entry['variants']:
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
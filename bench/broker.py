@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Local MQTT Broker Stand-in
+
+Just enough MQTT 3.1.1 for load tests, so they don't depend on
+broker.hivemq.com:
+- CONNECT / SUBSCRIBE / UNSUBSCRIBE / PINGREQ / DISCONNECT
+- PUBLISH at QoS 0 and 1 (acknowledged), always forwarded at QoS 0
+- '+' and '#' topic filters
+No retained messages, sessions, wills or authentication.
+
+Usage: python bench/broker.py [--host 127.0.0.1] [--port 1883]
+"""
+import argparse
+import asyncio
+import struct
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def topic_matches(pattern, topic):
+    """MQTT filter match: 'a/+/c' and 'a/#' style wildcards"""
+    pattern_parts, topic_parts = pattern.split('/'), topic.split('/')
+    for i, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts) or (part != '+' and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def encode_length(length):
+    """MQTT variable length integer"""
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def read_string(data, offset):
+    """Length prefixed UTF-8 string, returns (text, next offset)"""
+    (length,) = struct.unpack_from('!H', data, offset)
+    return data[offset + 2:offset + 2 + length].decode(), offset + 2 + length
+
+
+class Broker:
+    """Routes PUBLISH packets to every connection with a matching filter"""
+
+    def __init__(self):
+        self.subscriptions = {}  # writer -> set of filters
+        self.received = 0
+        self.delivered = 0
+
+    async def read_packet(self, reader):
+        header = await reader.readexactly(1)
+        length, shift = 0, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header[0], await reader.readexactly(length)
+
+    def publish(self, topic, payload):
+        """Forward one message at QoS 0 to every matching subscriber"""
+        self.received += 1
+        body = struct.pack('!H', len(topic.encode())) + topic.encode() + payload
+        packet = bytes([PUBLISH << 4]) + encode_length(len(body)) + body
+        for writer, filters in self.subscriptions.items():
+            if any(topic_matches(pattern, topic) for pattern in filters):
+                writer.write(packet)
+                self.delivered += 1
+
+    async def handle(self, reader, writer):
+        self.subscriptions[writer] = set()
+        try:
+            while True:
+                first, data = await self.read_packet(reader)
+                kind, flags = first >> 4, first & 0x0F
+                if kind == CONNECT:
+                    writer.write(bytes([CONNACK << 4, 2, 0, 0]))
+                elif kind == PUBLISH:
+                    topic, offset = read_string(data, 0)
+                    qos = (flags >> 1) & 3
+                    if qos:
+                        packet_id = data[offset:offset + 2]
+                        offset += 2
+                        writer.write(bytes([PUBACK << 4, 2]) + packet_id)
+                    self.publish(topic, data[offset:])
+                elif kind == SUBSCRIBE:
+                    packet_id, offset, granted = data[:2], 2, bytearray()
+                    while offset < len(data):
+                        pattern, offset = read_string(data, offset)
+                        offset += 1  # requested QoS, everything is delivered at 0
+                        self.subscriptions[writer].add(pattern)
+                        granted.append(0)
+                    writer.write(bytes([SUBACK << 4]) + encode_length(2 + len(granted)) + packet_id + granted)
+                elif kind == UNSUBSCRIBE:
+                    packet_id, offset = data[:2], 2
+                    while offset < len(data):
+                        pattern, offset = read_string(data, offset)
+                        self.subscriptions[writer].discard(pattern)
+                    writer.write(bytes([UNSUBACK << 4, 2]) + packet_id)
+                elif kind == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+                elif kind == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self.subscriptions[writer]
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"📡 Broker listening on {host}:{port}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal MQTT 3.1.1 broker for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+    try:
+        asyncio.run(Broker().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
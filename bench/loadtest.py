@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Plant Guardian Load Test
+
+End to end: simulated ESP32 sensors -> MQTT -> server.py -> Socket.IO viewers
+- Starts bench/broker.py and server.py (either --mode, or --server-workers)
+  on free local ports
+- Each simulated sensor has its own MQTT connection and publishes moisture
+  readings (crossing the threshold every --flip-every readings) and tap events
+- Headless Socket.IO viewers, spread over worker processes, timestamp
+  every update they receive
+- Reports publish-to-receipt latency (p50/p95/p99), throughput and the
+  server's CPU/memory per viewer as JSON
+- --baseline compares against an earlier result and exits 1 on a regression
+
+Server CPU/memory are read from /proc, so the numbers need Linux. They
+cover the server's worker processes too.
+
+Usage: python bench/loadtest.py --mode async --viewers 1000 --devices 100 --output result.json
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import paho.mqtt.client as mqtt
+
+ROOT = Path(__file__).resolve().parent.parent
+TOPIC_PREFIX = "murad/vase/"
+
+# Readings on either side of the server's MOISTURE_THRESHOLD (1500); the low
+# digits carry a per-sensor counter so each delivery maps back to its publish
+ALIVE_BASE = 2000
+DEAD_BASE = 500
+COUNTER_RANGE = 1000
+
+# Compared by --baseline: (metric path, True if higher is better)
+REGRESSION_METRICS = [
+    (("latency_ms", "moisture", "p99"), False),
+    (("latency_ms", "transition", "p99"), False),
+    (("latency_ms", "tap", "p99"), False),
+    (("throughput", "delivered_per_s"), True),
+    (("delivery", "tap"), True),
+    (("delivery", "transition"), True),
+    (("per_viewer", "cpu_ms_per_s"), False),
+    (("per_viewer", "rss_kb"), False),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def wait_for_listeners(port, count, timeout=30):
+    """Wait until count sockets listen on port (--workers binds one per worker with SO_REUSEPORT)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with open("/proc/net/tcp") as f:
+            listening = sum(1 for line in f.readlines()[1:]
+                            if line.split()[1].endswith(f":{port:04X}") and line.split()[3] == "0A")
+        if listening >= count:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def latency_summary(latencies):
+    """p50/p95/p99/max of a list of latencies in ms"""
+    values = sorted(latencies)
+    summary = {'count': len(values)}
+    for name, fraction in (("p50", .50), ("p95", .95), ("p99", .99), ("max", 1.0)):
+        value = percentile(values, fraction)
+        summary[name] = round(value, 2) if value is not None else None
+    return summary
+
+
+class ProcessStats:
+    """CPU time, resident memory and thread count of a process and its children from /proc"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf('SC_CLK_TCK')
+
+    def pids(self):
+        found, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            found.append(pid)
+            try:
+                for task in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{task}/children") as f:
+                        pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                continue
+        return found
+
+    def cpu_seconds(self):
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            total += int(fields[11]) + int(fields[12])  # utime + stime
+        return total / self.ticks
+
+    def _status(self, key):
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    total += next((int(line.split()[1]) for line in f if line.startswith(key + ':')), 0)
+            except OSError:
+                continue
+        return total
+
+    def rss_mb(self):
+        return self._status('VmRSS') / 1024
+
+    def threads(self):
+        return self._status('Threads')
+
+
+def viewer_worker(url, devices, ready, stop, results):
+    """Worker process: connect one Socket.IO viewer per device name, record every update"""
+    import socketio
+
+    async def run():
+        records = []
+        clients = []
+        limit = asyncio.Semaphore(50)
+
+        async def connect(device):
+            client = socketio.AsyncClient(reconnection=False)
+            client.on('moisture_update', lambda data: records.append(
+                (time.time(), 'moisture', data['device'], data['value'], data.get('changed', False))))
+            client.on('tap_event', lambda data: records.append(
+                (time.time(), 'tap', data['device'], data['data'], False)))
+            async with limit:
+                try:
+                    await client.connect(f"{url}?devices={device}", transports=['websocket'], wait_timeout=30)
+                    clients.append(client)
+                except Exception as e:
+                    print(f"⚠️ Viewer for {device} failed to connect: {e}", flush=True)
+
+        await asyncio.gather(*(connect(device) for device in devices))
+        ready.put(len(clients))
+        await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+        results.put(records)
+        for client in clients:
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+
+    asyncio.run(run())
+
+
+class Sensors:
+    """Simulated ESP32s: one MQTT connection each, publishing on a fixed schedule"""
+
+    def __init__(self, port, devices, moisture_hz, tap_hz, flip_every):
+        self.devices = devices
+        self.moisture_hz = moisture_hz
+        self.tap_hz = tap_hz
+        self.flip_every = flip_every
+        self.sent = {}  # (kind, device, tag) -> publish time
+        self.published = {'moisture': 0, 'transition': 0, 'tap': 0}
+        self.transitions = []  # device of every alive/dead flip
+        self.clients = []
+        for device in devices:
+            client = mqtt.Client(client_id=f"bench-{device}")
+            client.connect("127.0.0.1", port, 60)
+            self.clients.append(client)
+        self.counters = [0] * len(devices)
+
+    def moisture(self, i):
+        device, count = self.devices[i], self.counters[i]
+        self.counters[i] += 1
+        alive = (count // self.flip_every) % 2 == 0
+        value = (ALIVE_BASE if alive else DEAD_BASE) + count % COUNTER_RANGE
+        self.sent[('moisture', device, value)] = time.time()
+        self.clients[i].publish(f"{TOPIC_PREFIX}{device}/moisture", str(value))
+        self.published['moisture'] += 1
+        if count and count % self.flip_every == 0:
+            self.published['transition'] += 1
+            self.transitions.append(device)
+
+    def tap(self, i, seq):
+        device, payload = self.devices[i], f"tap {seq}"
+        self.sent[('tap', device, payload)] = time.time()
+        self.clients[i].publish(f"{TOPIC_PREFIX}{device}/events", payload)
+        self.published['tap'] += 1
+
+    def run(self, duration):
+        """Publish for duration seconds, sensors evenly phase shifted"""
+        start = time.time()
+        schedule = []
+        for i in range(len(self.devices)):
+            offset = i / len(self.devices)
+            if self.moisture_hz > 0:
+                schedule.append((start + offset / self.moisture_hz, i, 'moisture'))
+            if self.tap_hz > 0:
+                schedule.append((start + offset / self.tap_hz, i, 'tap'))
+        heapq.heapify(schedule)
+        next_misc, seq = start + 1, 0
+        while schedule:
+            due, i, kind = heapq.heappop(schedule)
+            if due >= start + duration:
+                break
+            time.sleep(max(0.0, due - time.time()))
+            if kind == 'moisture':
+                self.moisture(i)
+                heapq.heappush(schedule, (due + 1 / self.moisture_hz, i, kind))
+            else:
+                seq += 1
+                self.tap(i, seq)
+                heapq.heappush(schedule, (due + 1 / self.tap_hz, i, kind))
+            if time.time() >= next_misc:
+                # Keepalive and socket housekeeping, publishes themselves are written directly
+                for client in self.clients:
+                    client.loop(timeout=0)
+                next_misc += 1
+        return time.time() - start
+
+    def close(self):
+        for client in self.clients:
+            client.disconnect()
+
+
+def analyze(records, sensors):
+    """Match every received update with its publish time"""
+    latencies = {'moisture': [], 'transition': [], 'tap': []}
+    for received, kind, device, tag, changed in records:
+        sent = sensors.sent.get((kind, device, tag))
+        if sent is None:
+            continue  # State pushed on connect
+        latency = (received - sent) * 1000
+        latencies[kind].append(latency)
+        if changed:
+            latencies['transition'].append(latency)
+    return latencies
+
+
+def metric(result, path):
+    for key in path:
+        if not isinstance(result, dict) or result.get(key) is None:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(result, baseline, tolerance):
+    """Metrics that got worse than the baseline by more than tolerance (a fraction)"""
+    regressions = []
+    for path, higher_is_better in REGRESSION_METRICS:
+        current, previous = metric(result, path), metric(baseline, path)
+        if current is None or previous is None or previous == 0:
+            continue
+        change = (current - previous) / abs(previous)
+        worse = -change if higher_is_better else change
+        status = "❌" if worse > tolerance else "✅"
+        print(f"   {status} {'.'.join(path):<28} {previous:>12,.2f} -> {current:>12,.2f} ({change:+.0%})")
+        if worse > tolerance:
+            regressions.append('.'.join(path))
+    return regressions
+
+
+def run(args):
+    broker_port, http_port, admin_port = free_port(), free_port(), free_port()
+    devices = [f"bench{i:04d}" for i in range(args.devices)]
+    viewer_devices = [devices[i % len(devices)] for i in range(args.viewers)]
+    viewers_per_device = {device: viewer_devices.count(device) for device in devices}
+    processes = []
+
+    with tempfile.TemporaryDirectory() as history_dir:
+        try:
+            broker = subprocess.Popen([sys.executable, str(ROOT / "bench" / "broker.py"), "--port", str(broker_port)],
+                                      stdout=subprocess.DEVNULL)
+            processes.append(broker)
+            if not wait_for_port(broker_port):
+                raise RuntimeError("broker did not start")
+
+            env = dict(os.environ, MQTT_BROKER="127.0.0.1", MQTT_PORT=str(broker_port),
+                       HTTP_PORT=str(http_port), ADMIN_PORT=str(admin_port), HISTORY_DIR=history_dir)
+            log = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+            command = [sys.executable, str(ROOT / "server.py"), "--mode", args.mode]
+            if args.server_workers:
+                command += ["--workers", str(args.server_workers)]
+            elif args.mode == "threading":
+                command += ["--dev"]
+            server = subprocess.Popen(command,
+                                      cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+            processes.append(server)
+            if not wait_for_port(http_port, timeout=30):
+                raise RuntimeError("server did not start")
+            url = f"http://127.0.0.1:{http_port}"
+            # Ingest counters: the ingest process's admin port with --workers, viewer workers have none
+            counters_url = f"http://127.0.0.1:{admin_port}/api/stats" if args.server_workers else f"{url}/api/stats"
+            if args.server_workers and not (wait_for_listeners(http_port, args.server_workers)
+                                            and wait_for_port(admin_port)):
+                raise RuntimeError("server workers did not start")
+            stats = ProcessStats(server.pid)
+            time.sleep(1)
+            rss_idle = stats.rss_mb()
+            print(f"🚀 server.py --mode {args.mode} on :{http_port}, broker on :{broker_port}", flush=True)
+
+            # Viewers
+            ready, results, stop = multiprocessing.Queue(), multiprocessing.Queue(), multiprocessing.Event()
+            workers = [multiprocessing.Process(target=viewer_worker,
+                                               args=(url, viewer_devices[w::args.workers], ready, stop, results))
+                       for w in range(args.workers)]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            connected = sum(ready.get() for _ in workers)
+            connect_seconds = time.perf_counter() - started
+            print(f"👀 {connected}/{args.viewers} viewers connected in {connect_seconds:.1f}s", flush=True)
+            time.sleep(1)
+            rss_loaded, threads = stats.rss_mb(), stats.threads()
+
+            # Sensors
+            sensors = Sensors(broker_port, devices, args.moisture_hz, args.tap_hz, args.flip_every)
+            cpu_before = stats.cpu_seconds()
+            print(f"🌿 {len(devices)} sensors publishing for {args.duration:.0f}s", flush=True)
+            window = sensors.run(args.duration)
+            time.sleep(args.drain)
+            cpu_seconds = stats.cpu_seconds() - cpu_before
+            sensors.close()
+            with urllib.request.urlopen(counters_url) as response:
+                server_counters = json.load(response)
+
+            stop.set()
+            records = [record for _ in workers for record in results.get()]
+            for worker in workers:
+                worker.join()
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+
+    latencies = analyze(records, sensors)
+    expected_taps = sum(viewers_per_device[device] for kind, device, _ in sensors.sent if kind == 'tap')
+    expected_transitions = sum(viewers_per_device[device] for device in sensors.transitions)
+    delivered = sum(len(latencies[kind]) for kind in ('moisture', 'tap'))
+    return {
+        'config': {
+            'mode': args.mode, 'server_workers': args.server_workers, 'viewers': args.viewers, 'devices': args.devices,
+            'moisture_hz': args.moisture_hz, 'tap_hz': args.tap_hz, 'flip_every': args.flip_every,
+            'duration': args.duration, 'workers': args.workers,
+        },
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'connected': connected,
+        'connect_seconds': round(connect_seconds, 2),
+        'published': sensors.published,
+        'latency_ms': {kind: latency_summary(values) for kind, values in latencies.items()},
+        'delivery': {
+            'tap': round(len(latencies['tap']) / expected_taps, 4) if expected_taps else None,
+            'transition': round(len(latencies['transition']) / expected_transitions, 4) if expected_transitions else None,
+        },
+        'throughput': {
+            'published_per_s': round(sum(sensors.published[k] for k in ('moisture', 'tap')) / window, 1),
+            'delivered_per_s': round(delivered / window, 1),
+        },
+        'server': {
+            'cpu_seconds': round(cpu_seconds, 2),
+            'cpu_percent': round(100 * cpu_seconds / (window + args.drain), 1),
+            'rss_mb_idle': round(rss_idle, 1),
+            'rss_mb_loaded': round(rss_loaded, 1),
+            'threads': threads,
+            'counters': server_counters,
+        },
+        'per_viewer': {
+            'cpu_ms_per_s': round(1000 * cpu_seconds / (window + args.drain) / max(connected, 1), 4),
+            'rss_kb': round(1024 * (rss_loaded - rss_idle) / max(connected, 1), 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of server.py")
+    parser.add_argument("--mode", choices=("threading", "async"), default="threading")
+    parser.add_argument("--server-workers", type=int, default=0, help="run server.py --workers N")
+    parser.add_argument("--viewers", type=int, default=100)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--moisture-hz", type=float, default=1.0, help="readings per second per sensor")
+    parser.add_argument("--tap-hz", type=float, default=0.2, help="tap events per second per sensor")
+    parser.add_argument("--flip-every", type=int, default=10, help="readings between alive/dead transitions")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of publishing")
+    parser.add_argument("--drain", type=float, default=3.0, help="seconds to wait for late updates")
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1), help="viewer processes")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    parser.add_argument("--server-log", help="keep the server's output in this file")
+    parser.add_argument("--baseline", help="earlier result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression (default 0.25)")
+    args = parser.parse_args()
+
+    result = run(args)
+    text = json.dumps(result, indent=1)
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"💾 Result written to {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        print(f"📊 Compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print(f"❌ Regressed: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
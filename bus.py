@@ -0,0 +1,106 @@
+"""
+Local Event Bus
+
+Carries decoded updates from the ingest process to the web workers
+over a Unix socket:
+- One line of JSON per event: [event, data, room], encoded once and
+  written to every connected worker
+- A worker that stops reading is dropped once its send buffer passes
+  MAX_BUFFERED_BYTES, instead of growing the ingest process's memory
+- Workers reconnect on their own if the ingest process restarts the bus
+- set_state() publishes a STATE_EVENT that is also replayed to every
+  worker as it attaches, for status workers must know but can't observe
+"""
+import asyncio
+import json
+import logging
+import os
+
+MAX_BUFFERED_BYTES = 8 * 1024 * 1024
+RECONNECT_SECONDS = 1
+STATE_EVENT = "bus_state"
+
+log = logging.getLogger("plant.bus")
+
+
+class BusServer:
+    """Ingest side: fans every published event out to the connected workers"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.writers = set()
+        self.published = 0
+        self.dropped_workers = 0
+        self.state = None
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._accept, path=self.path)
+
+    async def _accept(self, reader, writer):
+        if self.state is not None:
+            writer.write(self._encode(STATE_EVENT, self.state, None))
+        self.writers.add(writer)
+        log.info("🔗 Worker attached to the bus (%d connected)", len(self.writers))
+        try:
+            # Workers never send anything, EOF means they went away
+            await reader.read()
+        except (ConnectionError, asyncio.CancelledError):
+            # Reset by the worker, or the bus shutting down
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def _encode(event, data, room):
+        return (json.dumps([event, data, room], separators=(',', ':')) + '\n').encode()
+
+    def set_state(self, state):
+        """Publish the current state, workers attaching later get it first"""
+        self.state = state
+        self.publish(STATE_EVENT, state, None)
+
+    def publish(self, event, data, room):
+        """Send one event to every worker, call from the event loop thread"""
+        line = self._encode(event, data, room)
+        self.published += 1
+        for writer in list(self.writers):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED_BYTES:
+                log.warning("⚠️ Dropping a worker that stopped reading the bus")
+                self.writers.discard(writer)
+                self.dropped_workers += 1
+                writer.transport.abort()
+                continue
+            writer.write(line)
+
+    async def close(self):
+        for writer in list(self.writers):
+            writer.close()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+async def subscribe(path):
+    """Worker side: yields (event, data, room) forever, reconnecting as needed"""
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(str(path), limit=MAX_BUFFERED_BYTES)
+        except OSError:
+            await asyncio.sleep(RECONNECT_SECONDS)
+            continue
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                yield tuple(json.loads(line))
+        finally:
+            writer.close()
+        log.warning("⚠️ Bus connection lost, reconnecting")
+        await asyncio.sleep(RECONNECT_SECONDS)
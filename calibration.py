@@ -0,0 +1,181 @@
+"""
+Sensor Calibration
+
+Maps raw 12-bit readings to moisture percent per device:
+- Profiles are piecewise linear ("points": [[raw, percent], ...], in any
+  order, so inverted capacitive sensors work), polynomials
+  ("polynomial": [c0, c1, ...] in raw) or least-squares fits of
+  measured points ("fit": [[raw, percent], ...], "degree": n)
+- Each profile is compiled once into 4096-entry lookup tables: percent
+  (float32) and zone (int8) for the alive threshold with its hysteresis
+  band, so a reading costs one index per table and a batch one
+  vectorized take; a smoothed (fractional) reading is looked up at the
+  nearest raw count
+- calibration.json is re-read when its mtime changes (checked at most
+  every CHECK_SECONDS), a broken file keeps the previous tables
+
+{"default": {"points": [[0, 0], [4095, 100]], "threshold": 36.6, "band": 2.4},
+ "profiles": {"cap-v1.2": {"points": [[3300, 0], [2500, 50], [1400, 100]]}},
+ "devices": {"vase1": "cap-v1.2", "vase2": {"profile": "cap-v1.2", "threshold": 45}}}
+"""
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+import numpy as np
+
+RAW_MAX = 4095
+TABLE_SIZE = RAW_MAX + 1
+CHECK_SECONDS = 1.0
+BOUNDARY_EPSILON = 1e-9
+CURVE_KEYS = ('points', 'polynomial', 'fit', 'degree')
+
+# Zones of the filtered reading: below threshold - band, at/below threshold,
+# above threshold, above threshold + band
+DRY, LOW, HIGH, WET = -2, -1, 1, 2
+
+log = logging.getLogger("plant.calibration")
+
+
+def linear_profile(threshold_raw, band_raw):
+    """The plain 0-4095 -> 0-100% mapping, threshold and band given in raw units"""
+    scale = 100.0 / RAW_MAX
+    return {'points': [[0, 0.0], [RAW_MAX, 100.0]], 'threshold': threshold_raw * scale, 'band': band_raw * scale}
+
+
+class Calibration:
+    """Compiled tables of one profile"""
+    __slots__ = ('name', 'percent', 'zones', 'zone_list', 'threshold', 'band')
+
+    def __init__(self, name, profile):
+        self.name = name
+        self.threshold = float(profile['threshold'])
+        self.band = float(profile.get('band', 0.0))
+        percent = compile_percent(profile)
+        # Zones from the float64 curve, a reading on a boundary (within rounding) has not crossed it
+        lower, upper = self.threshold - self.band - BOUNDARY_EPSILON, self.threshold + self.band + BOUNDARY_EPSILON
+        self.zones = np.select(
+            [percent < lower, percent <= self.threshold + BOUNDARY_EPSILON, percent <= upper],
+            [DRY, LOW, HIGH], WET).astype(np.int8)
+        self.zone_list = self.zones.tolist()  # Plain ints for one-reading lookups, numpy scalars are slower
+        self.percent = percent.astype(np.float32)
+
+    def percent_of(self, raw):
+        """Moisture percent of one raw reading"""
+        return float(self.percent[min(max(int(raw), 0), RAW_MAX)])
+
+
+def compile_percent(profile):
+    """4096-entry raw -> percent curve of a profile (float64), clipped to 0-100"""
+    raw = np.arange(TABLE_SIZE, dtype=np.float64)
+    if 'points' in profile:
+        points = sorted((float(r), float(p)) for r, p in profile['points'])
+        if len(points) < 2:
+            raise ValueError("a points profile needs at least two points")
+        percent = np.interp(raw, [r for r, _ in points], [p for _, p in points])
+    elif 'polynomial' in profile:
+        # Coefficients in increasing order: c0 + c1 * raw + c2 * raw^2 ...
+        percent = np.polynomial.polynomial.polyval(raw, [float(c) for c in profile['polynomial']])
+    elif 'fit' in profile:
+        points = np.asarray(profile['fit'], dtype=np.float64)
+        degree = int(profile.get('degree', 2))
+        if len(points) <= degree:
+            raise ValueError(f"a degree {degree} fit needs more than {degree} points")
+        percent = np.polynomial.polynomial.Polynomial.fit(points[:, 0], points[:, 1], degree)(raw)
+    else:
+        raise ValueError("a profile needs 'points', 'polynomial' or 'fit'")
+    return np.clip(percent, 0.0, 100.0)
+
+
+def merge_profile(base, override):
+    """override on top of base, a curve in override replaces the whole curve of base"""
+    if any(key in override for key in CURVE_KEYS):
+        base = {key: value for key, value in base.items() if key not in CURVE_KEYS}
+    return dict(base, **override)
+
+
+class CalibrationBank:
+    """Per-device calibrations from a JSON file, reloaded when the file changes"""
+
+    def __init__(self, path, default):
+        self.path = Path(path)
+        self.default_profile = dict(default)
+        self.version = 0
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._default = None
+        self._devices = {}
+        self.load()
+
+    def load(self):
+        """Compile the file (or just the default profile without one), raises on a broken file"""
+        mtime = self.path.stat().st_mtime_ns if self.path.is_file() else None
+        config = json.loads(self.path.read_text()) if mtime is not None else {}
+        default_profile = merge_profile(self.default_profile, config.get('default', {}))
+        profiles = {name: merge_profile(default_profile, profile) for name, profile in config.get('profiles', {}).items()}
+        compiled = {}
+
+        def build(name, profile):
+            # Devices sharing a profile share its tables
+            if name not in compiled:
+                compiled[name] = Calibration(name, profile)
+            return compiled[name]
+
+        default = build('(default)', default_profile)
+        devices = {}
+        for device, entry in config.get('devices', {}).items():
+            if isinstance(entry, str):
+                entry = {'profile': entry}
+            base = entry.get('profile')
+            if base is not None and base not in profiles:
+                raise ValueError(f"device {device}: unknown profile {base!r}")
+            profile = merge_profile(profiles[base] if base else default_profile, entry)
+            shared = base if len(entry) == 1 and base else f"device:{device}"
+            devices[device] = build(shared, profile)
+        with self._lock:
+            self._default, self._devices, self._mtime = default, devices, mtime
+            self.version += 1
+        return len(compiled)
+
+    def maybe_reload(self):
+        """Reload if the file changed, at most every CHECK_SECONDS"""
+        now = time.monotonic()
+        if now - self._checked < CHECK_SECONDS:
+            return False
+        self._checked = now
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        try:
+            count = self.load()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Keep serving the tables we have, try again once the file changes
+            self._mtime = mtime
+            log.error("❌ Calibration %s not reloaded: %s", self.path, e)
+            return False
+        log.info("📐 Calibration reloaded from %s: %d profiles, %d devices", self.path, count, len(self._devices))
+        return True
+
+    def get(self, device):
+        """Calibration of one device"""
+        self.maybe_reload()
+        return self._devices.get(device, self._default)
+
+    @property
+    def default(self):
+        return self._default
+
+    def describe(self):
+        """Profile, threshold and band of the default and of each configured device"""
+        def summary(calibration):
+            return {'profile': calibration.name, 'threshold': calibration.threshold, 'band': calibration.band}
+        return {
+            'version': self.version,
+            'default': summary(self._default),
+            'devices': {device: summary(calibration) for device, calibration in self._devices.items()},
+        }
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Clip Splitter
+
+Splits an exported character so the viewer can start on the idle loop
+before the rest of the animations arrive:
+- <name>.gltf/.bin keep the skinned mesh and the primary (idle) clips
+- Every other clip becomes a self-describing chunk in <name>.clips/
+- <name>.clips/index.json lists the chunks for the server's clip index
+
+Chunk layout (little endian):
+  'PGCL' | uint32 header length | JSON header (space padded to 4 bytes) | data
+The header lists one track per channel, addressed by node name so the
+browser can bind it to the already loaded skeleton.
+
+Usage: python clip_splitter.py web_assets/npc.gltf [more.gltf ...]
+"""
+import json
+import re
+import struct
+import sys
+from pathlib import Path
+from gltf_tools import Gltf, TYPE_SIZES
+
+CLIP_MAGIC = b'PGCL'
+CLIP_SUFFIX = "_animation"
+DEFAULT_PRIMARY_CLIPS = ("idle", "idle_breathing")
+SPLITTABLE_INTERPOLATIONS = ("LINEAR", "STEP")
+
+
+def clip_key(animation_name):
+    """Mapping name of a clip: 'die_animation' -> 'die'"""
+    if animation_name.endswith(CLIP_SUFFIX):
+        return animation_name[:-len(CLIP_SUFFIX)]
+    return animation_name
+
+
+def clips_dir(gltf_path):
+    """Directory holding the lazy clips of a character"""
+    gltf_path = Path(gltf_path)
+    return gltf_path.with_name(f"{gltf_path.stem}.clips")
+
+
+def splittable(gltf, animation, unique_names):
+    """Chunks address nodes by name, so every target needs a unique one"""
+    for channel in animation['channels']:
+        if animation['samplers'][channel['sampler']].get('interpolation', 'LINEAR') not in SPLITTABLE_INTERPOLATIONS:
+            return False
+        if gltf.json['nodes'][channel['target']['node']].get('name') not in unique_names:
+            return False
+    return True
+
+
+def encode_clip(gltf, animation):
+    """Serialize one animation into a chunk, returns (bytes, duration)"""
+    tracks, data, duration = [], bytearray(), 0.0
+
+    def append(raw):
+        data.extend(b'\0' * (-len(data) % 4))
+        offset = len(data)
+        data.extend(raw)
+        return offset
+
+    shared_inputs = {}
+    for channel in animation['channels']:
+        sampler = animation['samplers'][channel['sampler']]
+        times = gltf.accessors[sampler['input']]
+        output = gltf.accessors[sampler['output']]
+        if sampler['input'] not in shared_inputs:
+            shared_inputs[sampler['input']] = append(gltf.accessor_bytes(sampler['input']))
+        duration = max(duration, times.get('max', [0.0])[0])
+        tracks.append({
+            'node': gltf.json['nodes'][channel['target']['node']]['name'],
+            'path': channel['target']['path'],
+            'interpolation': sampler.get('interpolation', 'LINEAR'),
+            'input': {'offset': shared_inputs[sampler['input']], 'count': times['count']},
+            'output': {
+                'offset': append(gltf.accessor_bytes(sampler['output'])),
+                'count': output['count'] * TYPE_SIZES[output['type']],
+                'componentType': output['componentType'],
+                'normalized': output.get('normalized', False),
+            },
+        })
+
+    header = json.dumps({'name': animation.get('name', ''), 'duration': duration, 'tracks': tracks},
+                        separators=(',', ':')).encode()
+    header += b' ' * (-len(header) % 4)
+    return CLIP_MAGIC + struct.pack('<I', len(header)) + header + bytes(data), duration
+
+
+def split_clips(gltf_path, primary_clips=DEFAULT_PRIMARY_CLIPS):
+    """Move every non-primary clip of a glTF into its own chunk, returns the clip index"""
+    gltf_path = Path(gltf_path)
+    gltf = Gltf(gltf_path)
+    out_dir = clips_dir(gltf_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    names = [node.get('name') for node in gltf.json.get('nodes', [])]
+    unique_names = {name for name in names if name and names.count(name) == 1}
+
+    kept, clips = [], []
+    for animation in gltf.json.get('animations', []):
+        key = clip_key(animation.get('name', ''))
+        if key in primary_clips or not splittable(gltf, animation, unique_names):
+            kept.append(animation)
+            continue
+        chunk, duration = encode_clip(gltf, animation)
+        filename = re.sub(r'[^\w.-]', '_', key) + ".bin"
+        (out_dir / filename).write_bytes(chunk)
+        clips.append({'name': key, 'animation': animation.get('name', ''), 'file': filename,
+                      'bytes': len(chunk), 'duration': duration})
+
+    if kept:
+        gltf.json['animations'] = kept
+    else:
+        gltf.json.pop('animations', None)
+    gltf.save(gltf_path, binary_name=gltf.json['buffers'][0].get('uri') if gltf.json.get('buffers') else None)
+
+    # Drop chunks left over from an earlier split
+    current = {clip['file'] for clip in clips}
+    for stale in out_dir.glob('*.bin'):
+        if stale.name not in current:
+            stale.unlink()
+
+    index = {
+        'model': gltf_path.stem,
+        'primary': [clip_key(animation.get('name', '')) for animation in kept],
+        'clips': clips,
+    }
+    (out_dir / "index.json").write_text(json.dumps(index, indent=1))
+    return index
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        index = split_clips(path)
+        primary_bytes = sum(f.stat().st_size for f in Path(path).parent.glob(f"{Path(path).stem}.*") if f.is_file())
+        print(f"✂️  {path}: primary {', '.join(index['primary']) or '-'} ({primary_bytes:,} bytes)")
+        for clip in index['clips']:
+            print(f"   {clip['name']}: {clip['bytes']:,} bytes, {clip['duration']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Moisture Update Coalescer
+
+Sits between MQTT ingest and the Socket.IO broadcast:
+- Only the latest reading per sensor is kept until the next flush tick
+- Alive/dead transitions skip the tick and are sent immediately
+- Every update gets a sequence number, so a drained reading that an
+  urgent transition overtook is dropped instead of being emitted after
+  it (callers check current() while holding emit_lock)
+- Counters track how many readings came in and how many went out
+"""
+import threading
+
+
+class UpdateCoalescer:
+    def __init__(self):
+        self._pending = {}
+        self._urgent = {}  # key -> sequence number of its latest urgent update
+        self._seq = 0
+        self._lock = threading.Lock()
+        # Held around emits of both paths (threading mode), so a check and its emit can't be overtaken
+        self.emit_lock = threading.Lock()
+        self.received = 0
+        self.emitted = 0
+        self.superseded = 0
+
+    def offer(self, key, update, urgent=False):
+        """Record an update, returns True if the caller must emit it now"""
+        with self._lock:
+            self.received += 1
+            self._seq += 1
+            if urgent:
+                # The urgent update is the newest one, anything queued or being flushed is stale
+                self._pending.pop(key, None)
+                self._urgent[key] = self._seq
+                self.emitted += 1
+                return True
+            self._pending[key] = (self._seq, update)
+            return False
+
+    def drain(self):
+        """Take every pending update, returns a list of (key, seq, update)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.emitted += len(pending)
+        return [(key, seq, update) for key, (seq, update) in pending.items()]
+
+    def current(self, key, seq):
+        """False if an urgent update for key came in after the drained one, which is then dropped"""
+        with self._lock:
+            if self._urgent.get(key, 0) < seq:
+                return True
+            self.emitted -= 1
+            self.superseded += 1
+            return False
+
+    def stats(self):
+        """Snapshot of the ingest/emit counters"""
+        with self._lock:
+            received, emitted, pending = self.received, self.emitted, len(self._pending)
+            superseded = self.superseded
+        return {
+            'received': received,
+            'emitted': emitted,
+            'pending': pending,
+            'superseded': superseded,
+            'coalesced': received - emitted - pending,
+        }
@@ -0,0 +1,204 @@
+"""
+Per-Device State Table
+
+Moisture state for every vase under the MQTT wildcard:
+- Device id is the topic suffix (murad/vase/<device>/moisture, murad/vase/<device>/events)
+- Legacy topics without a device segment (murad/vase/moisture) map to DEFAULT_DEVICE
+- State lives in one fixed-size NumPy record array, one row per device
+- SharedDeviceTable keeps that array in shared memory, so worker
+  processes can read what the ingest process writes
+"""
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+
+TOPIC_PREFIX = "murad/vase/"
+DEFAULT_DEVICE = "default"
+MESSAGE_KINDS = ("moisture", "events")
+
+# One row per device: raw reading, alive flag, last update (unix seconds)
+STATE_DTYPE = np.dtype([
+    ('value', '<u2'),
+    ('alive', '?'),
+    ('updated', '<f8'),
+])
+
+# Shared layout: registered count, device names, then rows with a write sequence
+NAME_BYTES = 128
+SHARED_STATE_DTYPE = np.dtype([
+    ('seq', '<u4'),
+    ('value', '<u2'),
+    ('alive', '?'),
+    ('updated', '<f8'),
+])
+
+
+def parse_topic(topic, prefix=TOPIC_PREFIX):
+    """Split an MQTT topic into (device, kind)"""
+    suffix = topic[len(prefix):] if topic.startswith(prefix) else topic
+    parts = [part for part in suffix.split('/') if part]
+    kind = "moisture"
+    if parts and parts[-1] in MESSAGE_KINDS:
+        kind = parts.pop()
+    device = '/'.join(parts) or DEFAULT_DEVICE
+    return device, kind
+
+
+class DeviceTable:
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._slots = {}
+        self._names = []
+        self._rows = np.zeros(capacity, dtype=STATE_DTYPE)
+        self._rows['alive'] = True
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, device):
+        return device in self._slots
+
+    def names(self):
+        """Known device ids in registration order"""
+        return list(self._names)
+
+    def slot(self, device):
+        """Row index for a device, registering it on first sight"""
+        row = self._slots.get(device)
+        if row is not None:
+            return row
+        with self._lock:
+            row = self._slots.get(device)
+            if row is None:
+                if len(self._names) >= self.capacity:
+                    raise OverflowError(f"Device table full ({self.capacity} devices)")
+                row = len(self._names)
+                self._names.append(device)
+                self._slots[device] = row
+        return row
+
+    def update(self, device, value, alive, timestamp):
+        """Store a reading, returns the previous alive flag"""
+        row = self._rows[self.slot(device)]
+        was_alive = bool(row['alive'])
+        row['value'] = value
+        row['alive'] = alive
+        row['updated'] = timestamp
+        return was_alive
+
+    def get(self, device):
+        """(value, alive, updated) for a known device, None otherwise"""
+        row = self._slots.get(device)
+        if row is None:
+            return None
+        value, alive, updated = self._rows[row].tolist()
+        return value, alive, updated
+
+
+class SharedDeviceTable(DeviceTable):
+    """DeviceTable in shared memory: one writer process, any number of readers
+
+    Rows carry a sequence number (odd while a write is in progress), so a
+    reader retries instead of returning half of an update. Readers learn
+    new device names from the shared name list on lookup misses.
+    """
+
+    def __init__(self, capacity=1024, name=None):
+        self.capacity = capacity
+        self._slots = {}
+        self._names = []
+        self._lock = threading.Lock()
+        size = 8 + capacity * NAME_BYTES + capacity * SHARED_STATE_DTYPE.itemsize
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self._count = np.ndarray(1, dtype='<i8', buffer=self.shm.buf)
+        self._shared_names = np.ndarray(capacity, dtype=f'S{NAME_BYTES}', buffer=self.shm.buf, offset=8)
+        self._rows = np.ndarray(capacity, dtype=SHARED_STATE_DTYPE, buffer=self.shm.buf,
+                                offset=8 + capacity * NAME_BYTES)
+        if self.owner:
+            self._count[0] = 0
+            self._rows['seq'] = 0
+            self._rows['alive'] = True
+
+    @property
+    def name(self):
+        """Shared memory name to attach readers with"""
+        return self.shm.name
+
+    def _refresh(self):
+        """Pick up devices the writer registered since the last lookup"""
+        count = int(self._count[0])
+        with self._lock:
+            for row in range(len(self._names), count):
+                device = self._shared_names[row].decode()
+                self._names.append(device)
+                self._slots[device] = row
+
+    def __len__(self):
+        self._refresh()
+        return len(self._names)
+
+    def __contains__(self, device):
+        return self._lookup(device) is not None
+
+    def names(self):
+        self._refresh()
+        return list(self._names)
+
+    def _lookup(self, device):
+        row = self._slots.get(device)
+        if row is None:
+            self._refresh()
+            row = self._slots.get(device)
+        return row
+
+    def slot(self, device):
+        """Row index for a device, registering it on first sight (writer only)"""
+        row = self._slots.get(device)
+        if row is not None:
+            return row
+        encoded = device.encode()
+        if len(encoded) > NAME_BYTES:
+            raise OverflowError(f"Device id longer than {NAME_BYTES} bytes")
+        with self._lock:
+            row = self._slots.get(device)
+            if row is None:
+                if len(self._names) >= self.capacity:
+                    raise OverflowError(f"Device table full ({self.capacity} devices)")
+                row = len(self._names)
+                # Name first, then the count that publishes it
+                self._shared_names[row] = encoded
+                self._names.append(device)
+                self._slots[device] = row
+                self._count[0] = row + 1
+        return row
+
+    def update(self, device, value, alive, timestamp):
+        """Store a reading, returns the previous alive flag (writer only)"""
+        row = self._rows[self.slot(device)]
+        was_alive = bool(row['alive'])
+        row['seq'] += 1
+        row['value'] = value
+        row['alive'] = alive
+        row['updated'] = timestamp
+        row['seq'] += 1
+        return was_alive
+
+    def get(self, device):
+        """(value, alive, updated) for a known device, None otherwise"""
+        row = self._lookup(device)
+        if row is None:
+            return None
+        while True:
+            seq = int(self._rows[row]['seq'])
+            _, value, alive, updated = self._rows[row].tolist()
+            if not seq % 2 and int(self._rows[row]['seq']) == seq:
+                return value, alive, updated
+
+    def close(self):
+        """Detach, and free the block if this process created it"""
+        self._count = self._shared_names = self._rows = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,84 @@
+"""
+Export Build Cache
+
+Lets the character exporters skip work that has already been done:
+- Build key = hash of every input FBX + animation mapping + generated
+  Blender script + post-processing settings
+- An export whose key and outputs are unchanged is skipped entirely
+- Each imported clip is saved as a small .blend keyed by its FBX hash,
+  so changing one animation file only re-imports that one FBX
+- File hashes are memoized by (mtime, size) so a no-op check never
+  re-reads the FBX files
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).parent / ".export_cache"
+
+
+class ExportCache:
+    def __init__(self, name, cache_dir=CACHE_DIR):
+        self.dir = Path(cache_dir) / name
+        self.manifest_path = self.dir / "manifest.json"
+        try:
+            self.manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.manifest.setdefault('files', {})
+
+    def hash_file(self, path):
+        """Content hash of a file, reusing the stored hash while mtime/size match"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self.manifest['files'].get(path)
+        if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        self.manifest['files'][path] = [stat.st_mtime_ns, stat.st_size, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def clip_path(self, anim_name, fbx_path):
+        """Where the imported action of one FBX is cached"""
+        return str(self.dir / f"{anim_name}-{self.hash_file(fbx_path)[:16]}.blend")
+
+    def build_key(self, inputs, mapping, script, settings=None):
+        """Hash of everything that determines the export output"""
+        digest = hashlib.sha256()
+        for path in sorted(inputs):
+            digest.update(path.encode())
+            digest.update(self.hash_file(path).encode())
+        digest.update(json.dumps(mapping, sort_keys=True).encode())
+        digest.update(script.encode())
+        digest.update(json.dumps(settings or {}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _stamp(self, path):
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def is_fresh(self, key):
+        """True if the last export used the same key and its outputs are untouched"""
+        if self.manifest.get('build_key') != key:
+            return False
+        outputs = self.manifest.get('outputs', {})
+        try:
+            return bool(outputs) and all(self._stamp(path) == stamp for path, stamp in outputs.items())
+        except OSError:
+            return False
+
+    def record(self, key, outputs):
+        """Remember a successful export"""
+        self.manifest['build_key'] = key
+        self.manifest['outputs'] = {os.path.abspath(path): self._stamp(path) for path in outputs}
+        self.save()
+
+    def save(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.manifest, indent=1))
+        tmp.replace(self.manifest_path)
@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+Character Animation Exporter
+Builds every character listed in characters.json
+
+- One headless Blender process per character, run in a bounded process pool
+- Each character: base model (or the first animation) + animation clips -> glTF
+- Prints one summary with the wall time per character at the end
+
+Usage: python export_characters.py [npc zombie ...] [--jobs N] [--optimize-animations]
+       [--split-clips | --shared-library] [--glb] [--force]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from animation_optimizer import DEFAULT_TOLERANCES, optimize_animations, print_report
+from clip_splitter import DEFAULT_PRIMARY_CLIPS, clips_dir, split_clips
+from gltf_optimize import optimize_gltf, print_report as print_glb_report
+from shared_library import LIBRARY_DIR_NAME, add_to_library, share_clips, prune_library, print_library
+from texture_pipeline import process_gltf
+from export_cache import ExportCache
+
+MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "characters.json")
+
+# Lines from Blender's output that are worth showing
+BLENDER_MARKERS = ['🎨', '📁', '📥', '✅', '🎬', '🎭', '📦', '🚀', '❌']
+
+
+def load_manifest(path=MANIFEST):
+    """Read the character manifest, resolving paths relative to it"""
+    with open(path) as f:
+        manifest = json.load(f)
+    root = os.path.dirname(os.path.abspath(path))
+    manifest['output_dir'] = os.path.join(root, manifest.get('output_dir', 'web_assets'))
+    for name, character in manifest['characters'].items():
+        character['source_dir'] = os.path.join(root, character.get('source_dir', name))
+        character.setdefault('label', name.title())
+        character.setdefault('base_from_first_animation', False)
+    return manifest
+
+
+class CharacterExporter:
+    def __init__(self, name, character, manifest):
+        self.name = name
+        self.label = character['label']
+        self.source_dir = character['source_dir']
+        self.output_dir = character.get('output_dir', manifest['output_dir'])
+        self.gltf_file = os.path.join(self.output_dir, f"{name}.gltf")
+        self.blender_path = os.environ.get("BLENDER", manifest['blender'])
+        self.timeout = manifest.get('timeout', 120)
+
+        # Base model and animation files
+        self.base_model = character.get('base_model')
+        self.base_from_first_animation = character['base_from_first_animation']
+        self.animations = character['animations']
+
+        # Split layout (--split-clips): primary clips stay in the glTF, the rest load lazily
+        self.split_clips = False
+        self.primary_clips = tuple(character.get('primary_clips', DEFAULT_PRIMARY_CLIPS))
+
+        # Shared animation library (--shared-library): clips move to output_dir/library
+        self.shared_library = False
+
+        # Texture variants (--textures): resized WebP/PNG mips and KTX2 in output_dir/textures
+        self.build_textures = False
+
+        # Optimized .glb next to the glTF (--glb): quantized, interleaved, deduplicated
+        self.build_glb = False
+
+        # Animation optimization mode (--optimize-animations)
+        self.optimize_animations = False
+        self.animation_tolerances = dict(DEFAULT_TOLERANCES)
+
+        # Incremental build cache (--force ignores it)
+        self.cache = ExportCache(name)
+        self.force = False
+
+    def log(self, message):
+        print(f"[{self.name}] {message}", flush=True)
+
+    def find_files(self):
+        """Find the base model and animation files"""
+        self.log("✅ Found files:")
+
+        # Check base model
+        if not self.base_from_first_animation:
+            base_path = os.path.join(self.source_dir, self.base_model)
+            if not os.path.exists(base_path):
+                self.log(f"❌ Base model not found: {self.base_model}")
+                return False
+            self.log(f"   base: {self.base_model}")
+
+        # Check animation files
+        found_animations = {}
+        for anim_name, filename in self.animations.items():
+            anim_path = os.path.join(self.source_dir, filename)
+            if os.path.exists(anim_path):
+                found_animations[anim_name] = anim_path
+                self.log(f"   {anim_name}: {filename}")
+            else:
+                self.log(f"⚠️  Animation not found: {filename}")
+
+        if not found_animations:
+            self.log("❌ No animation files found")
+            return False
+        if self.base_from_first_animation and next(iter(self.animations)) not in found_animations:
+            self.log(f"❌ Base animation not found: {next(iter(self.animations.values()))}")
+            return False
+
+        self.found_animations = found_animations
+        return True
+
+    def create_export_script(self):
+        """Create Blender Python script for export"""
+        base_path = None
+        if not self.base_from_first_animation:
+            base_path = os.path.join(self.source_dir, self.base_model)
+
+        animations_dict = "{\n"
+        for name, path in self.found_animations.items():
+            animations_dict += f'    "{name}": r"{path}",\n'
+        animations_dict += "}"
+
+        clip_caches_dict = "{\n"
+        for name, path in self.found_animations.items():
+            clip_caches_dict += f'    "{name}": r"{self.cache.clip_path(name, path)}",\n'
+        clip_caches_dict += "}"
+
+        script = f'''
+import bpy
+import os
+
+print("🎨 Setting up {self.label} export...")
+
+# Clear scene
+bpy.ops.object.select_all(action='SELECT')
+bpy.ops.object.delete(use_global=False)
+
+# Animation paths
+animations = {animations_dict}
+
+# Actions imported by earlier runs, keyed by FBX content hash
+clip_caches = {clip_caches_dict}
+
+base_from_first_animation = {self.base_from_first_animation}
+
+if base_from_first_animation:
+    # Import first animation as base (includes mesh and armature)
+    base_name, base_model_path = list(animations.items())[0]
+    remaining = list(animations.items())[1:]
+else:
+    # Import base character model with mesh
+    base_name, base_model_path = None, r"{base_path}"
+    remaining = list(animations.items())
+
+print("📁 Loading base character model...")
+print(f"📥 Importing base model: {{os.path.basename(base_model_path)}}")
+bpy.ops.import_scene.fbx(filepath=base_model_path)
+
+# Find the base armature and mesh
+base_armature = None
+base_mesh = None
+
+for obj in bpy.context.scene.objects:
+    if obj.type == 'ARMATURE':
+        base_armature = obj
+        base_armature.name = "{self.label}_Armature"
+        print(f"✅ Found base armature: {{base_armature.name}}")
+    elif obj.type == 'MESH':
+        base_mesh = obj
+        base_mesh.name = "{self.label}_Mesh"
+        print(f"✅ Found base mesh: {{base_mesh.name}} ({{len(base_mesh.data.vertices)}} vertices)")
+
+if not base_armature or (not base_mesh and not base_from_first_animation):
+    print("❌ Base model missing armature or mesh")
+    exit(1)
+
+# The base animation keeps its clip under the mapped name
+if base_name and base_armature.animation_data and base_armature.animation_data.action:
+    action = base_armature.animation_data.action
+    action.name = f"{{base_name}}_animation"
+    print(f"✅ Renamed base action to: {{action.name}}")
+
+print("📁 Loading animation files...")
+
+# Import animations and merge into base armature
+for anim_name, fbx_path in remaining:
+    clip_cache = clip_caches.get(anim_name)
+    if clip_cache and os.path.exists(clip_cache):
+        # Unchanged FBX: load the action saved by an earlier run instead of importing
+        with bpy.data.libraries.load(clip_cache) as (data_from, data_to):
+            data_to.actions = list(data_from.actions)
+        for action in data_to.actions:
+            action.use_fake_user = True
+            print(f"   🎬 Reused cached action for {{anim_name}}: {{action.name}}")
+        continue
+
+    if fbx_path and os.path.exists(fbx_path):
+        print(f"📥 Importing {{anim_name}}: {{os.path.basename(fbx_path)}}")
+
+        # Store current objects
+        objects_before = set(bpy.context.scene.objects)
+
+        # Import animation FBX
+        bpy.ops.import_scene.fbx(filepath=fbx_path)
+
+        # Find new objects
+        objects_after = set(bpy.context.scene.objects)
+        new_objects = objects_after - objects_before
+
+        # Process new armature and merge animations
+        for obj in new_objects:
+            if obj.type == 'ARMATURE':
+                # Copy animations from this armature to base armature
+                if obj.animation_data and obj.animation_data.action:
+                    action = obj.animation_data.action
+                    print(f"   🎬 Found action: {{action.name}}")
+
+                    # Rename action based on animation type
+                    action.name = f"{{anim_name}}_animation"
+                    print(f"   ✅ Renamed to: {{action.name}}")
+
+                    # Cache the action so the next run can skip this FBX
+                    bpy.data.libraries.write(clip_caches[anim_name], {{action}}, fake_user=True)
+
+                # Remove the temporary armature
+                bpy.data.objects.remove(obj, do_unlink=True)
+            elif obj.type == 'MESH':
+                # Remove duplicate meshes
+                bpy.data.objects.remove(obj, do_unlink=True)
+
+# Report final actions
+print("🎭 Final animations:")
+action_count = 0
+for action in bpy.data.actions:
+    print(f"   {{action.name}} ({{action.frame_range[1] - action.frame_range[0]:.0f}} frames)")
+    action_count += 1
+
+print(f"✅ Total actions: {{action_count}}")
+
+# Select base armature and mesh for export
+print("📦 Selecting objects for export:")
+bpy.ops.object.select_all(action='DESELECT')
+base_armature.select_set(True)
+bpy.context.view_layer.objects.active = base_armature
+print(f"   ✅ Armature: {{base_armature.name}}")
+if base_mesh:
+    base_mesh.select_set(True)
+    print(f"   ✅ Mesh: {{base_mesh.name}} ({{len(base_mesh.data.vertices)}} vertices)")
+
+# Create output directory
+output_dir = r"{self.output_dir}"
+os.makedirs(output_dir, exist_ok=True)
+
+# Export to glTF
+gltf_path = r"{self.gltf_file}"
+print(f"🚀 Exporting to: {{gltf_path}}")
+
+bpy.ops.export_scene.gltf(
+    filepath=gltf_path,
+    export_format='GLTF_SEPARATE',
+    use_selection=True,
+    export_animations=True,
+    export_frame_range=False,
+    export_force_sampling=True,
+    export_nla_strips=False,
+    export_def_bones=True,
+    export_optimize_animation_size={self.optimize_animations}
+)
+
+print("✅ Export complete!")
+print(f"📁 Files saved to: {{output_dir}}")
+'''
+        return script
+
+    def run_blender_export(self):
+        """Run Blender with the export script"""
+        self.log(f"🎨 Using Blender: {self.blender_path}")
+        self.log("🚀 Running Blender export...")
+
+        script = self.create_export_script()
+
+        # Write script to a temporary file (one per character, exports run in parallel)
+        script_path = os.path.join(self.output_dir, f"temp_{self.name}_export.py")
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(script_path, 'w') as f:
+            f.write(script)
+
+        try:
+            result = subprocess.run([
+                self.blender_path,
+                "--background",
+                "--python", script_path
+            ], capture_output=True, text=True, timeout=self.timeout)
+
+            # Print Blender output with proper formatting
+            for line in result.stdout.split('\n'):
+                if any(marker in line for marker in BLENDER_MARKERS):
+                    self.log(f"   {line}")
+
+            if result.stderr and "WARNING" not in result.stderr:
+                self.log(f"⚠️  Blender warnings:\n{result.stderr}")
+
+            return result.returncode == 0
+
+        except subprocess.TimeoutExpired:
+            self.log("❌ Blender export timed out")
+            return False
+        except Exception as e:
+            self.log(f"❌ Error running Blender: {e}")
+            return False
+        finally:
+            # Clean up temporary script
+            if os.path.exists(script_path):
+                os.remove(script_path)
+
+    def exported_files(self):
+        """Paths of the files this exporter produces"""
+        files = [os.path.join(self.output_dir, file) for file in os.listdir(self.output_dir)
+                 if file.startswith(f"{self.name}.")]
+        clip_dir = clips_dir(self.gltf_file)
+        if clip_dir.is_dir():
+            files.extend(str(path) for path in clip_dir.iterdir())
+        return [path for path in files if os.path.isfile(path)]
+
+    def verify_export(self):
+        """Verify the exported files"""
+        if not os.path.exists(self.gltf_file):
+            self.log("❌ Export failed - no glTF file found")
+            return False
+
+        # List created files
+        files = self.exported_files()
+        self.log("✅ Export successful!")
+        self.log(f"📁 Created {len(files)} files:")
+        for file_path in sorted(files):
+            size = os.path.getsize(file_path)
+            self.log(f"   - {os.path.basename(file_path)} ({size:,} bytes)")
+
+        return True
+
+    def build_key(self):
+        """Cache key covering the input files, mapping, script and settings"""
+        inputs = list(self.found_animations.values())
+        if not self.base_from_first_animation:
+            inputs.append(os.path.join(self.source_dir, self.base_model))
+        settings = {
+            'optimize_animations': self.optimize_animations,
+            'tolerances': self.animation_tolerances,
+            'split_clips': self.split_clips,
+            'primary_clips': self.primary_clips,
+            'textures': self.build_textures,
+            'glb': self.build_glb,
+            'shared_library': self.shared_library,
+        }
+        return self.cache.build_key(inputs, self.animations, self.create_export_script(), settings)
+
+    def export(self):
+        """Export this character, returns 'exported', 'cached' or 'failed'"""
+        self.log(f"🌱 {self.label} Animation Exporter")
+
+        if not self.find_files():
+            return "failed"
+
+        # Skip Blender entirely when nothing changed since the last export
+        build_key = self.build_key()
+        if not self.force and self.cache.is_fresh(build_key):
+            self.cache.save()
+            self.log("✅ Up to date - no inputs changed since the last export")
+            return "cached"
+
+        if not self.run_blender_export():
+            return "failed"
+
+        if self.optimize_animations:
+            print_report(optimize_animations(self.gltf_file, self.animation_tolerances))
+
+        if self.split_clips:
+            index = split_clips(self.gltf_file, self.primary_clips)
+            self.log(f"✂️  Primary clips: {', '.join(index['primary']) or '-'}, "
+                     f"lazy clips: {', '.join(clip['name'] for clip in index['clips']) or '-'}")
+
+        if self.build_textures:
+            process_gltf(self.gltf_file)
+
+        if self.shared_library:
+            entry = add_to_library(self.gltf_file, primary_clips=self.primary_clips)
+            self.log(f"📚 Library clips: {', '.join(clip['name'] for clip in entry['clips']) or '-'}")
+
+        if self.build_glb:
+            print_glb_report(optimize_gltf(self.gltf_file))
+
+        if not self.verify_export():
+            return "failed"
+
+        self.cache.record(build_key, self.exported_files())
+        return "exported"
+
+
+def export_character(name, character, manifest, options):
+    """Process pool entry point: export one character, returns (name, status, seconds)"""
+    started = time.perf_counter()
+    exporter = CharacterExporter(name, character, manifest)
+    exporter.optimize_animations = options['optimize_animations']
+    exporter.animation_tolerances.update(options['tolerances'])
+    exporter.force = options['force']
+    exporter.split_clips = options['split_clips']
+    exporter.build_textures = options['textures']
+    exporter.build_glb = options['glb']
+    exporter.shared_library = options['shared_library']
+    try:
+        status = exporter.export()
+    except Exception as e:
+        exporter.log(f"❌ Export crashed: {e}")
+        status = "failed"
+    return name, status, time.perf_counter() - started
+
+
+def export_all(manifest, names, options, jobs):
+    """Export the given characters in parallel, returns {name: (status, seconds)}"""
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(export_character, name, manifest['characters'][name], manifest, options)
+                   for name in names]
+        for future in as_completed(futures):
+            name, status, seconds = future.result()
+            results[name] = (status, seconds)
+    return results
+
+
+def print_summary(results, names, wall, jobs):
+    """One line per character with its wall time"""
+    icons = {"exported": "✅", "cached": "♻️ ", "failed": "❌"}
+    print("\n" + "=" * 50)
+    print(f"📊 Export summary: {len(names)} characters in {wall:.1f}s ({jobs} workers)")
+    print("=" * 50)
+    for name in names:
+        status, seconds = results[name]
+        print(f"   {icons[status]} {name:<16} {status:<9} {seconds:7.2f}s")
+
+
+def parse_tolerance(text):
+    """Parse a CHANNEL=VALUE tolerance override"""
+    channel, _, value = text.partition("=")
+    if channel not in DEFAULT_TOLERANCES:
+        raise argparse.ArgumentTypeError(f"unknown channel {channel!r}, expected one of {', '.join(DEFAULT_TOLERANCES)}")
+    return channel, float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("characters", nargs="*", help="characters to export (default: all in the manifest)")
+    parser.add_argument("--manifest", default=MANIFEST, help="character manifest (default: characters.json)")
+    parser.add_argument("--jobs", type=int, help="parallel Blender processes (default: manifest max_workers)")
+    parser.add_argument("--optimize-animations", action="store_true",
+                        help="simplify curves, drop constant tracks and quantize keys after export")
+    parser.add_argument("--tolerance", type=parse_tolerance, action="append", default=[],
+                        metavar="CHANNEL=VALUE", help="max error per channel, e.g. rotation=0.001")
+    parser.add_argument("--split-clips", action="store_true",
+                        help="keep only the idle clips in the glTF, write the others as lazy chunks")
+    parser.add_argument("--textures", action="store_true",
+                        help="build resized/compressed texture variants and point the glTF at them")
+    parser.add_argument("--shared-library", action="store_true",
+                        help="move every clip into one rig-relative library shared by all characters")
+    parser.add_argument("--glb", action="store_true",
+                        help="also write a quantized, interleaved .glb (gltf_optimize.py) for the viewer")
+    parser.add_argument("--force", action="store_true", help="export even if the build cache is up to date")
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest(args.manifest)
+    names = args.characters or list(manifest['characters'])
+    unknown = [name for name in names if name not in manifest['characters']]
+    if unknown:
+        parser.error(f"unknown character(s): {', '.join(unknown)}")
+    if args.split_clips and args.shared_library:
+        parser.error("--split-clips and --shared-library are alternatives, pick one")
+    jobs = max(1, min(args.jobs or manifest.get('max_workers', os.cpu_count() or 1), len(names)))
+    options = {
+        'optimize_animations': args.optimize_animations,
+        'tolerances': dict(args.tolerance),
+        'force': args.force,
+        'split_clips': args.split_clips,
+        'textures': args.textures,
+        'glb': args.glb,
+        'shared_library': args.shared_library,
+    }
+
+    started = time.perf_counter()
+    results = export_all(manifest, names, options, jobs)
+    print_summary(results, names, time.perf_counter() - started, jobs)
+
+    shared = os.path.join(manifest['output_dir'], LIBRARY_DIR_NAME)
+    if args.shared_library and os.path.isdir(shared):
+        # After every export (characters run in parallel): clips opted in with "shared_clips"
+        share_clips(shared, {name: character.get('shared_clips', {}) for name, character in manifest['characters'].items()})
+        prune_library(shared)
+        print_library(shared)
+
+    success = all(status != "failed" for status, _ in results.values())
+    if success:
+        print("\n🎉 Ready to start web viewer!")
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Moisture Filters
+
+Decides alive/dead from a smoothed reading instead of every raw sample:
+- median: rolling median over the last `window` readings
+- ema: exponential moving average with weight `alpha` on the new reading
+- none: raw readings
+The filtered value then goes through hysteresis on the device's
+calibration zones (calibration.py): a live plant dies only below
+threshold - band, a dead one comes back only above threshold + band, so
+a sensor hovering around the threshold no longer flips the state on
+every reading.
+
+Every filter is updated incrementally, O(window) for the median (a small
+fixed window) and O(1) for the EMA.
+"""
+import bisect
+import json
+from collections import deque
+from pathlib import Path
+import numpy as np
+from calibration import RAW_MAX, DRY, WET
+
+FILTER_METHODS = ("median", "ema", "none")
+DEFAULT_FILTER = {'method': "median", 'window': 5, 'alpha': 0.3}
+
+
+class MedianFilter:
+    def __init__(self, window):
+        self.window = max(1, int(window))
+        self.recent = deque()
+        self.ordered = []
+
+    def push(self, value):
+        self.recent.append(value)
+        bisect.insort(self.ordered, value)
+        if len(self.recent) > self.window:
+            del self.ordered[bisect.bisect_left(self.ordered, self.recent.popleft())]
+        middle = len(self.ordered) // 2
+        if len(self.ordered) % 2:
+            return float(self.ordered[middle])
+        return (self.ordered[middle - 1] + self.ordered[middle]) / 2
+
+
+class EmaFilter:
+    def __init__(self, alpha):
+        self.alpha = float(alpha)
+        self.value = None
+
+    def push(self, value):
+        if self.value is None:
+            self.value = float(value)
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class PassThrough:
+    def push(self, value):
+        return float(value)
+
+
+class SensorFilter:
+    """Smoothing plus hysteresis for one sensor"""
+
+    def __init__(self, method="median", window=5, alpha=0.3):
+        if method not in FILTER_METHODS:
+            raise ValueError(f"unknown filter {method!r}, expected one of {', '.join(FILTER_METHODS)}")
+        if method == "median":
+            self.smoother = MedianFilter(window)
+        elif method == "ema":
+            self.smoother = EmaFilter(alpha)
+        else:
+            self.smoother = PassThrough()
+        self.alive = None
+
+    def push(self, value, zones):
+        """Feed one raw reading, zones: the device's calibration zones (a list), returns (filtered value, alive)"""
+        filtered = self.smoother.push(value)
+        index = int(filtered + 0.5)
+        if not 0 <= index <= RAW_MAX:
+            index = min(max(index, 0), RAW_MAX)
+        zone = zones[index]
+        if self.alive is None:
+            self.alive = zone > 0
+        elif zone == DRY:
+            self.alive = False
+        elif zone == WET:
+            self.alive = True
+        return filtered, self.alive
+
+    def push_many(self, values, zones):
+        """Feed a batch of raw readings in order, returns (filtered array, alive array)"""
+        filtered = np.fromiter((self.smoother.push(value) for value in values.tolist()), dtype=np.float64,
+                               count=len(values))
+        zone = zones[np.clip(np.floor(filtered + 0.5), 0, RAW_MAX).astype(np.intp)]
+        # The state follows the latest reading outside the band, before that the previous state
+        decisive = np.where((zone == DRY) | (zone == WET), np.arange(len(zone)), -1)
+        last = np.maximum.accumulate(decisive)
+        before = bool(zone[0] > 0) if self.alive is None else self.alive
+        alive = np.where(last >= 0, zone[np.maximum(last, 0)] == WET, before)
+        if len(alive):
+            self.alive = bool(alive[-1])
+        return filtered, alive
+
+
+class FilterBank:
+    """One SensorFilter per device, created on first reading, judged against the device's calibration"""
+
+    def __init__(self, calibration, default=None, devices=None, capacity=1024):
+        self.calibration = calibration
+        self.default = dict(DEFAULT_FILTER, **(default or {}))
+        self.overrides = devices or {}
+        self.capacity = capacity
+        self._filters = {}
+
+    @classmethod
+    def from_file(cls, calibration, path, capacity=1024, **default):
+        """Bank with defaults and per-device overrides from a JSON file, if it exists:
+        {"default": {"method": "ema", "alpha": 0.2}, "devices": {"vase1": {"window": 9}}}"""
+        config = json.loads(Path(path).read_text()) if Path(path).is_file() else {}
+        return cls(calibration, dict(default, **config.get('default', {})), config.get('devices', {}), capacity)
+
+    def config(self, device):
+        """Filter settings of a device: defaults plus its overrides (the hysteresis band lives in calibration.json)"""
+        config = dict(self.default, **self.overrides.get(device, {}))
+        config.pop('band', None)
+        return config
+
+    def __len__(self):
+        return len(self._filters)
+
+    def get(self, device):
+        sensor = self._filters.get(device)
+        if sensor is None:
+            if len(self._filters) >= self.capacity:
+                raise OverflowError(f"Filter bank full ({self.capacity} devices)")
+            sensor = self._filters[device] = SensorFilter(**self.config(device))
+        return sensor
+
+    def push(self, device, value):
+        """Feed one reading, returns (filtered value, alive)"""
+        return self.get(device).push(value, self.calibration.get(device).zone_list)
+
+    def push_many(self, device, values):
+        """Feed a batch of readings in order, returns (filtered array, alive array)"""
+        return self.get(device).push_many(values, self.calibration.get(device).zones)
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+glTF Optimizer
+
+Post-export pass that turns a Blender glTF into a compact .glb, no
+Blender needed:
+- Nodes no scene or skin reaches are stripped, with their animation
+  channels and any mesh/skin left unused
+- UV sets past the highest one a material samples are dropped
+- Accessors with identical contents are merged (shared keyframe times,
+  repeated tracks, duplicate UV sets)
+- Vertex attributes are quantized (KHR_mesh_quantization): int16
+  positions, int8 normals/tangents, 16-bit UVs, uint8 skin weights
+- Each primitive's vertex attributes share one interleaved buffer view
+- Everything is packed into one .glb next to the input, and a
+  size/parse-time report is printed (--report also writes it as JSON)
+
+Positions are stored as normalized int16 of position / scale. For a
+skinned mesh the scale is folded into the skin's inverse bind matrices,
+for a static leaf node into its scale, so the rendered result matches.
+
+Usage: python gltf_optimize.py web_assets/npc.gltf [more.gltf ...] [--no-quantize] [--report report.json]
+"""
+import argparse
+import json
+import statistics
+import struct
+import time
+from pathlib import Path
+from gltf_tools import Gltf, COMPONENT_SIZES, TYPE_SIZES, GLB_JSON_CHUNK, GLB_BIN_CHUNK
+
+QUANTIZATION_EXTENSION = "KHR_mesh_quantization"
+
+BYTE = 5120
+UNSIGNED_BYTE = 5121
+SHORT = 5122
+UNSIGNED_SHORT = 5123
+FLOAT = 5126
+
+PARSE_RUNS = 5
+
+
+# Scene graph
+
+def _reachable_nodes(document):
+    nodes = document.get('nodes', [])
+    used = set()
+    pending = [root for scene in document.get('scenes', []) for root in scene.get('nodes', [])]
+    for skin in document.get('skins', []):
+        pending.extend(skin['joints'])
+        if 'skeleton' in skin:
+            pending.append(skin['skeleton'])
+    while pending:
+        index = pending.pop()
+        if index not in used:
+            used.add(index)
+            pending.extend(nodes[index].get('children', []))
+    return used
+
+
+def _compact(items, keep):
+    """Keep the listed items in order, returns (items, old index -> new index)"""
+    remap = {old: new for new, old in enumerate(sorted(keep))}
+    return [items[old] for old in sorted(keep)], remap
+
+
+def strip_unused_nodes(gltf):
+    """Drop unreachable nodes, their animation channels and unused meshes/skins, returns nodes removed"""
+    document = gltf.json
+    nodes = document.get('nodes', [])
+    used = _reachable_nodes(document)
+    removed = len(nodes) - len(used)
+    if removed:
+        nodes, remap = _compact(nodes, used)
+        document['nodes'] = nodes
+        for node in nodes:
+            if 'children' in node:
+                node['children'] = [remap[child] for child in node['children']]
+        for scene in document.get('scenes', []):
+            scene['nodes'] = [remap[root] for root in scene.get('nodes', [])]
+        for skin in document.get('skins', []):
+            skin['joints'] = [remap[joint] for joint in skin['joints']]
+            if 'skeleton' in skin:
+                skin['skeleton'] = remap[skin['skeleton']]
+        for animation in document.get('animations', []):
+            channels = [channel for channel in animation['channels'] if channel['target'].get('node') in remap]
+            for channel in channels:
+                channel['target']['node'] = remap[channel['target']['node']]
+            samplers, sampler_remap = _compact(animation['samplers'], {channel['sampler'] for channel in channels})
+            for channel in channels:
+                channel['sampler'] = sampler_remap[channel['sampler']]
+            animation['channels'], animation['samplers'] = channels, samplers
+        document['animations'] = [animation for animation in document.get('animations', []) if animation['channels']]
+        if not document['animations']:
+            del document['animations']
+
+    for key, reference in (('meshes', 'mesh'), ('skins', 'skin')):
+        if key not in document:
+            continue
+        items, remap = _compact(document[key], {node[reference] for node in nodes if reference in node})
+        for node in nodes:
+            if reference in node:
+                node[reference] = remap[node[reference]]
+        document[key] = items
+        if not items:
+            del document[key]
+    return removed
+
+
+def _texture_coords(value):
+    """texCoord sets a material samples (every textureInfo in it, extensions included)"""
+    if isinstance(value, dict):
+        found = {value.get('texCoord', 0)} if 'index' in value else set()
+        for child in value.values():
+            found |= _texture_coords(child)
+        return found
+    if isinstance(value, list):
+        return set().union(*map(_texture_coords, value)) if value else set()
+    return set()
+
+
+def strip_unused_uvs(gltf):
+    """Drop TEXCOORD_n past the highest set the primitive's material samples, returns sets removed"""
+    materials = gltf.json.get('materials', [])
+    removed = 0
+    for mesh in gltf.json.get('meshes', []):
+        for primitive in mesh['primitives']:
+            if 'material' not in primitive:
+                continue
+            used = _texture_coords(materials[primitive['material']])
+            highest = max(used) if used else -1
+            attributes = primitive['attributes']
+            for name in [name for name in attributes if name.startswith('TEXCOORD_')]:
+                if int(name.split('_')[1]) > highest:
+                    del attributes[name]
+                    removed += 1
+    return removed
+
+
+# Accessors
+
+def dedupe_accessors(gltf):
+    """Point every reference at the first accessor with the same contents, returns references merged"""
+    canonical, merged = {}, 0
+    for container, key, target in gltf.accessor_refs():
+        index = container[key]
+        accessor = gltf.accessors[index]
+        signature = (accessor['componentType'], accessor['type'], accessor['count'],
+                     accessor.get('normalized', False), target, gltf.accessor_bytes(index))
+        first = canonical.setdefault(signature, index)
+        if first != index:
+            container[key] = first
+            merged += 1
+    return merged
+
+
+def _normalized(values, component_type):
+    scale = {BYTE: 127, UNSIGNED_BYTE: 255, SHORT: 32767, UNSIGNED_SHORT: 65535}[component_type]
+    low = 0 if component_type in (UNSIGNED_BYTE, UNSIGNED_SHORT) else -scale
+    return [max(low, min(scale, round(v * scale))) for v in values]
+
+
+def _quantize_directions(gltf, index):
+    values, _ = gltf.read_accessor(index)
+    accessor = gltf.accessors[index]
+    return gltf.add_accessor(_normalized(values, BYTE), accessor['type'], BYTE, normalized=True)
+
+
+def _quantize_uvs(gltf, index):
+    values, _ = gltf.read_accessor(index)
+    if min(values, default=0) >= 0 and max(values, default=0) <= 1:
+        component_type = UNSIGNED_SHORT
+    elif min(values, default=0) >= -1 and max(values, default=0) <= 1:
+        component_type = SHORT
+    else:
+        return index  # tiled UVs would need KHR_texture_transform, keep floats
+    return gltf.add_accessor(_normalized(values, component_type), 'VEC2', component_type, normalized=True)
+
+
+def _quantize_weights(gltf, index):
+    values, _ = gltf.read_accessor(index)
+    weights = []
+    for i in range(0, len(values), 4):
+        vertex = _normalized(values[i:i + 4], UNSIGNED_BYTE)
+        # Keep the sum at exactly 255 so rounding never scales a vertex
+        vertex[vertex.index(max(vertex))] += 255 - sum(vertex)
+        weights.extend(vertex)
+    return gltf.add_accessor(weights, 'VEC4', UNSIGNED_BYTE, normalized=True)
+
+
+def _quantize_positions(gltf, index, scale):
+    values, _ = gltf.read_accessor(index)
+    quantized = _normalized([v / scale for v in values], SHORT)
+    return gltf.add_accessor(quantized, 'VEC3', SHORT, normalized=True, bounds=True)
+
+
+def _position_owners(gltf):
+    """mesh index -> how its dequantization scale can be applied, None when it cannot"""
+    document = gltf.json
+    users, skin_users = {}, {}
+    for node in document.get('nodes', []):
+        if 'mesh' in node:
+            users.setdefault(node['mesh'], []).append(node)
+        if 'skin' in node:
+            skin_users.setdefault(node['skin'], []).append(node)
+    owners = {}
+    for mesh, nodes in users.items():
+        if any(primitive.get('targets') for primitive in document['meshes'][mesh]['primitives']):
+            owners[mesh] = None  # morph deltas would need the same scale
+        elif len(nodes) != 1:
+            owners[mesh] = None
+        elif 'skin' in nodes[0]:
+            skin = document['skins'][nodes[0]['skin']]
+            shared = len(skin_users[nodes[0]['skin']]) != 1
+            owners[mesh] = None if shared or 'inverseBindMatrices' not in skin else ('skin', skin)
+        elif 'matrix' in nodes[0] or nodes[0].get('children'):
+            owners[mesh] = None  # a node scale would also scale its children
+        else:
+            owners[mesh] = ('node', nodes[0])
+    return owners
+
+
+def _apply_scale(gltf, owner, scale):
+    kind, target = owner
+    if kind == 'node':
+        target['scale'] = [s * scale for s in target.get('scale', [1.0, 1.0, 1.0])]
+        return
+    # inverseBind' = inverseBind * diag(s, s, s, 1): scale the first three columns
+    matrices, _ = gltf.read_accessor(target['inverseBindMatrices'])
+    matrices = [v * scale if i % 16 < 12 else v for i, v in enumerate(matrices)]
+    target['inverseBindMatrices'] = gltf.add_accessor(matrices, 'MAT4', FLOAT)
+
+
+def quantize_meshes(gltf):
+    """KHR_mesh_quantization vertex formats and one interleaved view per primitive, returns attributes quantized"""
+    quantized, done = 0, {}
+    owners = _position_owners(gltf)
+    for mesh_index, mesh in enumerate(gltf.json.get('meshes', [])):
+        owner = owners.get(mesh_index)
+        scale = None
+        if owner:
+            extent = 0.0
+            for primitive in mesh['primitives']:
+                if 'POSITION' in primitive['attributes']:
+                    accessor = gltf.accessors[primitive['attributes']['POSITION']]
+                    if accessor['componentType'] != FLOAT:
+                        extent = 0.0
+                        break
+                    values, _ = gltf.read_accessor(primitive['attributes']['POSITION'])
+                    extent = max(extent, max(map(abs, values), default=0.0))
+            if extent > 0:
+                scale = extent
+                _apply_scale(gltf, owner, scale)
+
+        for primitive_index, primitive in enumerate(mesh['primitives']):
+            attributes = primitive['attributes']
+            for name, index in list(attributes.items()):
+                if gltf.accessors[index]['componentType'] != FLOAT:
+                    continue
+                key = (name.split('_')[0], index)
+                if key not in done:
+                    if name == 'POSITION' and scale:
+                        done[key] = _quantize_positions(gltf, index, scale)
+                    elif name in ('NORMAL', 'TANGENT'):
+                        done[key] = _quantize_directions(gltf, index)
+                    elif name.startswith('TEXCOORD_'):
+                        done[key] = _quantize_uvs(gltf, index)
+                    elif name.startswith('WEIGHTS_'):
+                        done[key] = _quantize_weights(gltf, index)
+                    else:
+                        done[key] = index
+                    quantized += done[key] != index
+                attributes[name] = done[key]
+            for index in attributes.values():
+                gltf.accessors[index].setdefault('_interleave', (mesh_index, primitive_index))
+
+    if quantized:
+        used = gltf.json.setdefault('extensionsUsed', [])
+        required = gltf.json.setdefault('extensionsRequired', [])
+        for extensions in (used, required):
+            if QUANTIZATION_EXTENSION not in extensions:
+                extensions.append(QUANTIZATION_EXTENSION)
+    return quantized
+
+
+def interleave_meshes(gltf):
+    """One interleaved view per primitive without changing the vertex formats"""
+    for mesh_index, mesh in enumerate(gltf.json.get('meshes', [])):
+        for primitive_index, primitive in enumerate(mesh['primitives']):
+            for index in primitive['attributes'].values():
+                gltf.accessors[index].setdefault('_interleave', (mesh_index, primitive_index))
+
+
+# Report
+
+def _vertex_bytes(gltf):
+    total = 0
+    for mesh in gltf.json.get('meshes', []):
+        for primitive in mesh['primitives']:
+            for index in primitive['attributes'].values():
+                accessor = gltf.accessors[index]
+                size = COMPONENT_SIZES[accessor['componentType']] * TYPE_SIZES[accessor['type']]
+                total += accessor['count'] * (size + (-size % 4))
+    return total
+
+
+def _parse_ms(document_bytes):
+    """Median json.loads time of the document, a stand-in for the loader's JSON parse"""
+    runs = []
+    for _ in range(PARSE_RUNS):
+        started = time.perf_counter()
+        json.loads(document_bytes)
+        runs.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(runs), 2)
+
+
+def _glb_chunks(path):
+    data = Path(path).read_bytes()
+    offset, chunks = 12, {}
+    while offset < len(data):
+        length, kind = struct.unpack_from('<II', data, offset)
+        chunks[kind] = data[offset + 8:offset + 8 + length]
+        offset += 8 + length
+    return chunks
+
+
+def _stats(gltf, path):
+    path = Path(path)
+    if path.suffix.lower() == '.glb':
+        chunks = _glb_chunks(path)
+        document = chunks.get(GLB_JSON_CHUNK, b'')
+        binary = len(chunks.get(GLB_BIN_CHUNK, b''))
+    else:
+        document = path.read_bytes()
+        binary = sum(len(buffer) for buffer in gltf.buffers)
+    return {
+        'file_bytes': path.stat().st_size + (0 if path.suffix.lower() == '.glb' else binary),
+        'json_bytes': len(document),
+        'bin_bytes': binary,
+        'vertex_bytes': _vertex_bytes(gltf),
+        'accessors': len(gltf.json.get('accessors', [])),
+        'buffer_views': len(gltf.json.get('bufferViews', [])),
+        'json_parse_ms': _parse_ms(document),
+    }
+
+
+def optimize_gltf(gltf_path, output=None, quantize=True):
+    """Write an optimized .glb next to the input (or to output), returns the report"""
+    gltf_path = Path(gltf_path)
+    output = Path(output) if output else gltf_path.with_suffix('.glb')
+    gltf = Gltf(gltf_path)
+    before = _stats(gltf, gltf_path)
+
+    steps = {
+        'nodes_removed': strip_unused_nodes(gltf),
+        'uv_sets_removed': strip_unused_uvs(gltf),
+        'accessors_merged': dedupe_accessors(gltf),
+    }
+    if quantize:
+        steps['attributes_quantized'] = quantize_meshes(gltf)
+    else:
+        interleave_meshes(gltf)
+    gltf.save(output)
+
+    after = _stats(Gltf(output), output)
+    return {'input': str(gltf_path), 'output': str(output), 'before': before, 'after': after, **steps}
+
+
+def print_report(report):
+    """Before/after sizes and JSON parse time"""
+    before, after = report['before'], report['after']
+
+    def change(key, unit=""):
+        old, new = before[key], after[key]
+        saved = f" (-{100 * (1 - new / old):.0f}%)" if old else ""
+        return f"{old:,}{unit} -> {new:,}{unit}{saved}"
+
+    print(f"🗜️  {report['input']} -> {report['output']}")
+    print(f"   total:    {change('file_bytes', ' B')}")
+    print(f"   JSON:     {change('json_bytes', ' B')}, parse {before['json_parse_ms']} -> {after['json_parse_ms']} ms")
+    print(f"   binary:   {change('bin_bytes', ' B')}, vertices {change('vertex_bytes', ' B')}")
+    print(f"   accessors {before['accessors']} -> {after['accessors']}, "
+          f"buffer views {before['buffer_views']} -> {after['buffer_views']}")
+    print(f"   nodes removed {report['nodes_removed']}, UV sets removed {report['uv_sets_removed']}, "
+          f"accessor references merged {report['accessors_merged']}, "
+          f"attributes quantized {report.get('attributes_quantized', 0)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize Blender glTF exports into compact .glb files")
+    parser.add_argument("gltf", nargs="+", help=".gltf files to optimize (each one writes <name>.glb)")
+    parser.add_argument("--no-quantize", action="store_true", help="keep float vertex attributes")
+    parser.add_argument("--report", help="also write the reports to this JSON file")
+    args = parser.parse_args()
+
+    reports = []
+    for path in args.gltf:
+        report = optimize_gltf(path, quantize=not args.no_quantize)
+        print_report(report)
+        reports.append(report)
+    if args.report:
+        Path(args.report).write_text(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
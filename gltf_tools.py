@@ -0,0 +1,300 @@
+"""
+glTF Tools
+
+Minimal pure-Python reader/writer for the glTF files Blender exports:
+- Loads .gltf (separate .bin or data URIs) and .glb
+- Reads accessors into flat arrays, adds new accessors from raw values
+- Rewrites external URIs in place (rewrite_uris) for versioned serving
+- Repacks on save: unused accessors are dropped and every remaining
+  accessor gets its own tightly packed, 4-byte aligned buffer view,
+  except accessors tagged with the same '_interleave' key, which share
+  one strided vertex buffer view
+"""
+import base64
+import json
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+COMPONENT_FORMATS = {5120: 'b', 5121: 'B', 5122: 'h', 5123: 'H', 5125: 'I', 5126: 'f'}
+COMPONENT_SIZES = {5120: 1, 5121: 1, 5122: 2, 5123: 2, 5125: 4, 5126: 4}
+NORMALIZED_SCALE = {5120: 127.0, 5121: 255.0, 5122: 32767.0, 5123: 65535.0}
+TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+GLB_MAGIC = 0x46546C67
+GLB_JSON_CHUNK = 0x4E4F534A
+GLB_BIN_CHUNK = 0x004E4942
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def _padded(data, pad=b'\0'):
+    return data + pad * (-len(data) % 4)
+
+
+def rewrite_uris(data, rename):
+    """.gltf/.glb bytes with every external buffer/image URI replaced by rename(uri)
+
+    rename returns the new URI or None to keep it; data: URIs are never
+    passed. Returns the input unchanged when nothing was renamed."""
+    binary = data[:4] == struct.pack('<I', GLB_MAGIC)
+    if binary:
+        json_length = struct.unpack_from('<I', data, 12)[0]
+        document = json.loads(data[20:20 + json_length])
+    else:
+        document = json.loads(data)
+    changed = False
+    for item in document.get('buffers', []) + document.get('images', []):
+        uri = item.get('uri')
+        if uri and not uri.startswith('data:'):
+            renamed = rename(uri)
+            if renamed and renamed != uri:
+                item['uri'] = renamed
+                changed = True
+    if not changed:
+        return data
+    encoded = json.dumps(document, separators=(',', ':')).encode()
+    if not binary:
+        return encoded
+    encoded = _padded(encoded, b' ')
+    rest = data[20 + json_length:]
+    return struct.pack('<III', GLB_MAGIC, 2, 20 + len(encoded) + len(rest)) + \
+        struct.pack('<II', len(encoded), GLB_JSON_CHUNK) + encoded + rest
+
+
+class Gltf:
+    def __init__(self, path):
+        self.path = Path(path)
+        if self.path.suffix.lower() == '.glb':
+            self.json, self.buffers = self._read_glb(self.path.read_bytes())
+        else:
+            self.json = json.loads(self.path.read_text())
+            self.buffers = [self._read_buffer(buffer) for buffer in self.json.get('buffers', [])]
+
+    def _read_buffer(self, buffer):
+        uri = buffer.get('uri', '')
+        if uri.startswith('data:'):
+            return base64.b64decode(uri.split(',', 1)[1])
+        return (self.path.parent / uri).read_bytes()
+
+    def _read_glb(self, data):
+        magic, _, length = struct.unpack_from('<III', data, 0)
+        if magic != GLB_MAGIC:
+            raise ValueError(f"{self.path} is not a GLB file")
+        offset, document, binary = 12, None, b''
+        while offset < length:
+            chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+            chunk = data[offset + 8:offset + 8 + chunk_length]
+            if chunk_type == GLB_JSON_CHUNK:
+                document = json.loads(chunk)
+            elif chunk_type == GLB_BIN_CHUNK:
+                binary = chunk
+            offset += 8 + chunk_length
+        return document, [binary]
+
+    # Accessors
+
+    @property
+    def accessors(self):
+        return self.json.setdefault('accessors', [])
+
+    def accessor_bytes(self, index):
+        """Tightly packed bytes of an accessor (strides and sparse data resolved)"""
+        accessor = self.accessors[index]
+        if '_data' in accessor:
+            return accessor['_data']
+        element = COMPONENT_SIZES[accessor['componentType']] * TYPE_SIZES[accessor['type']]
+        count = accessor['count']
+        if 'bufferView' in accessor:
+            view = self.json['bufferViews'][accessor['bufferView']]
+            buffer = self.buffers[view['buffer']]
+            start = view.get('byteOffset', 0) + accessor.get('byteOffset', 0)
+            stride = view.get('byteStride') or element
+            if stride == element:
+                data = bytes(buffer[start:start + element * count])
+            else:
+                data = b''.join(buffer[start + i * stride:start + i * stride + element] for i in range(count))
+        else:
+            data = bytes(element * count)
+        if 'sparse' in accessor:
+            data = self._apply_sparse(accessor, data, element)
+        return data
+
+    def _apply_sparse(self, accessor, data, element):
+        sparse = accessor['sparse']
+        indices, values = sparse['indices'], sparse['values']
+        index_view = self.json['bufferViews'][indices['bufferView']]
+        value_view = self.json['bufferViews'][values['bufferView']]
+        index_start = index_view.get('byteOffset', 0) + indices.get('byteOffset', 0)
+        index_size = COMPONENT_SIZES[indices['componentType']]
+        targets = array(COMPONENT_FORMATS[indices['componentType']],
+                        self.buffers[index_view['buffer']][index_start:index_start + index_size * sparse['count']])
+        value_start = value_view.get('byteOffset', 0) + values.get('byteOffset', 0)
+        source = self.buffers[value_view['buffer']]
+        data = bytearray(data)
+        for i, target in enumerate(_little_endian(targets)):
+            data[target * element:(target + 1) * element] = source[value_start + i * element:value_start + (i + 1) * element]
+        return bytes(data)
+
+    def read_accessor(self, index, normalize=True):
+        """Accessor values as a flat array, returns (values, components)"""
+        accessor = self.accessors[index]
+        component_type = accessor['componentType']
+        values = array(COMPONENT_FORMATS[component_type], self.accessor_bytes(index))
+        values = _little_endian(values)
+        if normalize and accessor.get('normalized'):
+            scale = NORMALIZED_SCALE[component_type]
+            values = array('f', (max(v / scale, -1.0) for v in values))
+        return values, TYPE_SIZES[accessor['type']]
+
+    def add_accessor(self, values, accessor_type, component_type=5126, normalized=False,
+                     target=None, bounds=False):
+        """Append an accessor holding `values` (flat), returns its index"""
+        packed = _little_endian(array(COMPONENT_FORMATS[component_type], values))
+        components = TYPE_SIZES[accessor_type]
+        accessor = {
+            'componentType': component_type,
+            'count': len(packed) // components,
+            'type': accessor_type,
+            '_data': packed.tobytes(),
+        }
+        if normalized:
+            accessor['normalized'] = True
+        if target is not None:
+            accessor['_target'] = target
+        if bounds and len(packed):
+            accessor['min'] = [min(packed[c::components]) for c in range(components)]
+            accessor['max'] = [max(packed[c::components]) for c in range(components)]
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def accessor_refs(self):
+        """Every (container, key) pair in the document that holds an accessor index"""
+        refs = []
+        for mesh in self.json.get('meshes', []):
+            for primitive in mesh['primitives']:
+                attributes = primitive['attributes']
+                refs.extend((attributes, name, ARRAY_BUFFER) for name in attributes)
+                if 'indices' in primitive:
+                    refs.append((primitive, 'indices', ELEMENT_ARRAY_BUFFER))
+                for morph in primitive.get('targets', []):
+                    refs.extend((morph, name, ARRAY_BUFFER) for name in morph)
+        for skin in self.json.get('skins', []):
+            if 'inverseBindMatrices' in skin:
+                refs.append((skin, 'inverseBindMatrices', None))
+        for animation in self.json.get('animations', []):
+            for sampler in animation['samplers']:
+                refs.append((sampler, 'input', None))
+                refs.append((sampler, 'output', None))
+        return refs
+
+    def _interleave(self, indices):
+        """Vertex-interleaved bytes of same-count accessors, returns (data, stride, offsets)"""
+        columns = [self.accessor_bytes(index) for index in indices]
+        sizes = [COMPONENT_SIZES[self.accessors[index]['componentType']] * TYPE_SIZES[self.accessors[index]['type']]
+                 for index in indices]
+        count = self.accessors[indices[0]]['count']
+        if any(self.accessors[index]['count'] != count for index in indices):
+            raise ValueError("interleaved accessors must have the same count")
+        # Every attribute starts on a 4-byte boundary inside the vertex
+        padded = [size + (-size % 4) for size in sizes]
+        offsets = [sum(padded[:i]) for i in range(len(padded))]
+        stride = sum(padded)
+        data = bytearray(stride * count)
+        for column, size, offset in zip(columns, sizes, offsets):
+            for i in range(count):
+                data[i * stride + offset:i * stride + offset + size] = column[i * size:(i + 1) * size]
+        return bytes(data), stride, offsets
+
+    # Writing
+
+    def repack(self):
+        """Rebuild a single binary buffer holding only what the document references"""
+        refs = self.accessor_refs()
+        remap, accessors, views, blob = {}, [], [], bytearray()
+
+        def add_view(data, target=None, stride=None):
+            blob.extend(b'\0' * (-len(blob) % 4))
+            view = {'buffer': 0, 'byteOffset': len(blob), 'byteLength': len(data)}
+            if stride:
+                view['byteStride'] = stride
+            if target is not None:
+                view['target'] = target
+            views.append(view)
+            blob.extend(data)
+            return len(views) - 1
+
+        def add_accessor(old, view, offset=None):
+            accessor = dict(self.accessors[old])
+            for key in ('_data', '_target', '_interleave', 'sparse', 'byteOffset'):
+                accessor.pop(key, None)
+            accessor['bufferView'] = view
+            if offset:
+                accessor['byteOffset'] = offset
+            remap[old] = len(accessors)
+            accessors.append(accessor)
+
+        groups = {}
+        for old in dict.fromkeys(container[key] for container, key, _ in refs):
+            if '_interleave' in self.accessors[old]:
+                groups.setdefault(self.accessors[old]['_interleave'], []).append(old)
+
+        for container, key, target in refs:
+            old = container[key]
+            if old not in remap:
+                group = groups.get(self.accessors[old].get('_interleave'))
+                if group:
+                    data, stride, offsets = self._interleave(group)
+                    view = add_view(data, ARRAY_BUFFER, stride)
+                    for member, offset in zip(group, offsets):
+                        add_accessor(member, view, offset)
+                else:
+                    data = self.accessor_bytes(old)
+                    add_accessor(old, add_view(data, self.accessors[old].get('_target', target)))
+            container[key] = remap[old]
+
+        for image in self.json.get('images', []):
+            if 'bufferView' in image:
+                view = self.json['bufferViews'][image['bufferView']]
+                start = view.get('byteOffset', 0)
+                image['bufferView'] = add_view(self.buffers[view['buffer']][start:start + view['byteLength']])
+
+        self.json['accessors'] = accessors
+        self.json['bufferViews'] = views
+        self.json['buffers'] = [{'byteLength': len(blob)}]
+        self.buffers = [bytes(blob)]
+        for key in ('accessors', 'bufferViews', 'buffers'):
+            if not views:
+                self.json.pop(key, None)
+        return self
+
+    def save(self, path, binary_name=None):
+        """Write .gltf + .bin (or a single .glb when path ends in .glb)"""
+        path = Path(path)
+        self.repack()
+        if path.suffix.lower() == '.glb':
+            document = _padded(json.dumps(self.json, separators=(',', ':')).encode(), b' ')
+            binary = _padded(self.buffers[0])
+            length = 12 + 8 + len(document) + (8 + len(binary) if binary else 0)
+            with open(path, 'wb') as f:
+                f.write(struct.pack('<III', GLB_MAGIC, 2, length))
+                f.write(struct.pack('<II', len(document), GLB_JSON_CHUNK) + document)
+                if binary:
+                    f.write(struct.pack('<II', len(binary), GLB_BIN_CHUNK) + binary)
+        else:
+            if 'buffers' in self.json:
+                binary_name = binary_name or path.with_suffix('.bin').name
+                self.json['buffers'][0]['uri'] = binary_name
+                (path.parent / binary_name).write_bytes(self.buffers[0])
+            path.write_text(json.dumps(self.json, separators=(',', ':')))
+        self.path = path
+        return path
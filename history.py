@@ -0,0 +1,234 @@
+"""
+Moisture History Store
+
+Keeps every reading so the viewer can draw long time ranges:
+- Fixed-size NumPy ring buffer per device for recent windows
+- Append-only binary log per device on disk (10 bytes per reading),
+  memory-mapped when a query reaches past the ring buffer
+- Server-side downsampling (LTTB or min/max buckets) before anything
+  is sent to the browser
+"""
+import threading
+from pathlib import Path
+from urllib.parse import quote
+import numpy as np
+
+# On-disk record: unix timestamp (seconds) + raw 0-4095 reading
+RECORD_DTYPE = np.dtype([('t', '<f8'), ('v', '<u2')])
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+class RingBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype='<f8')
+        self.values = np.zeros(capacity, dtype='<u2')
+        self.head = 0   # next write position
+        self.count = 0
+
+    def extend(self, times, values):
+        """Append readings, oldest ones are overwritten once full"""
+        times = np.asarray(times, dtype='<f8')[-self.capacity:]
+        values = np.asarray(values, dtype='<u2')[-self.capacity:]
+        n = len(times)
+        end = self.head + n
+        if end <= self.capacity:
+            self.times[self.head:end] = times
+            self.values[self.head:end] = values
+        else:
+            split = self.capacity - self.head
+            self.times[self.head:] = times[:split]
+            self.values[self.head:] = values[:split]
+            self.times[:n - split] = times[split:]
+            self.values[:n - split] = values[split:]
+        self.head = end % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def oldest(self):
+        """Timestamp of the oldest reading still held, None when empty"""
+        if not self.count:
+            return None
+        return float(self.times[(self.head - self.count) % self.capacity])
+
+    def window(self, start, end):
+        """Readings with start <= t <= end in chronological order"""
+        first = (self.head - self.count) % self.capacity
+        order = (np.arange(self.count) + first) % self.capacity
+        times, values = self.times[order], self.values[order]
+        lo = np.searchsorted(times, start, side='left')
+        hi = np.searchsorted(times, end, side='right')
+        return times[lo:hi], values[lo:hi]
+
+
+class HistoryLog:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'ab')
+
+    def last(self):
+        """Timestamp of the newest record on disk, None for an empty log"""
+        self.flush()
+        count = self.path.stat().st_size // RECORD_DTYPE.itemsize
+        if not count:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek((count - 1) * RECORD_DTYPE.itemsize)
+            return float(np.frombuffer(f.read(RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)['t'][0])
+
+    def extend(self, times, values):
+        """Append readings to the buffered log"""
+        records = np.empty(len(times), dtype=RECORD_DTYPE)
+        records['t'] = times
+        records['v'] = values
+        self._file.write(records.tobytes())
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def window(self, start, end):
+        """Readings with start <= t <= end, read through a memory map"""
+        self.flush()
+        count = self.path.stat().st_size // RECORD_DTYPE.itemsize  # ignore a torn last record
+        if not count:
+            return np.empty(0, dtype='<f8'), np.empty(0, dtype='<u2')
+        records = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+        times = records['t']
+        lo = np.searchsorted(times, start, side='left')
+        hi = np.searchsorted(times, end, side='right')
+        return np.array(times[lo:hi]), np.array(records['v'][lo:hi])
+
+
+class DeviceHistory:
+    def __init__(self, path, ring_size):
+        self.ring = RingBuffer(ring_size)
+        self.log = HistoryLog(path)
+        self.lock = threading.Lock()
+        self.last = self.log.last()  # newest stored timestamp, time never goes backwards past it
+
+    def extend(self, times, values):
+        """Append readings, a timestamp older than the newest stored one is raised to it
+        (the ring buffer and log are searched with searchsorted, they must stay sorted)"""
+        times = np.maximum.accumulate(np.asarray(times, dtype='<f8'))
+        with self.lock:
+            if self.last is not None:
+                times = np.maximum(times, self.last)
+            self.ring.extend(times, values)
+            self.log.extend(times, values)
+            self.last = float(times[-1])
+
+    def window(self, start, end):
+        """Serve from the ring buffer when it covers the range, else from disk"""
+        with self.lock:
+            oldest = self.ring.oldest()
+            if oldest is not None and oldest <= start:
+                return self.ring.window(start, end)
+            return self.log.window(start, end)
+
+
+class HistoryStore:
+    def __init__(self, directory, ring_size=8192):
+        self.directory = Path(directory)
+        self.ring_size = ring_size
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self, device, create=True):
+        """History for one device, opening its log on first use"""
+        history = self._series.get(device)
+        if history is not None:
+            return history
+        path = self.directory / f"{quote(device, safe='')}.bin"
+        # Queries only open logs that already exist, possibly from an earlier run
+        if not create and not path.exists():
+            return None
+        with self._lock:
+            history = self._series.get(device)
+            if history is None:
+                history = self._series[device] = DeviceHistory(path, self.ring_size)
+        return history
+
+    def record(self, device, timestamp, value):
+        """Store a single reading"""
+        self.series(device).extend([timestamp], [value])
+
+    def extend(self, device, times, values):
+        """Store a batch of readings"""
+        self.series(device).extend(times, values)
+
+    def query(self, device, start, end, points, method="lttb"):
+        """Downsampled readings for a device, None if it has no history"""
+        history = self.series(device, create=False)
+        if history is None:
+            return None
+        times, values = history.window(start, end)
+        raw_count = len(times)
+        if method == "minmax":
+            times, values = downsample_minmax(times, values, points)
+        else:
+            times, values = downsample_lttb(times, values, points)
+        return {
+            'device': device,
+            'from': start,
+            'to': end,
+            'method': method,
+            'raw_count': raw_count,
+            't': times.tolist(),
+            'value': values.tolist(),
+        }
+
+    def flush(self):
+        for history in list(self._series.values()):
+            with history.lock:
+                history.log.flush()
+
+    def close(self):
+        for history in list(self._series.values()):
+            with history.lock:
+                history.log.close()
+
+
+def downsample_lttb(times, values, points):
+    """Largest-Triangle-Three-Buckets: keeps the visual shape with `points` samples"""
+    n = len(times)
+    if points >= n or points < 3:
+        return times, values
+    y = values.astype('<f8')
+    # Bucket edges for the n - 2 interior points, first and last are always kept
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle corner
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_t = times[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        area = np.abs(
+            (times[a] - avg_t) * (y[lo:hi] - y[a])
+            - (times[a] - times[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return times[selected], values[selected]
+
+
+def downsample_minmax(times, values, points):
+    """Min and max of each time bucket, `points` samples in total"""
+    n = len(times)
+    if points >= n:
+        return times, values
+    buckets = max(points // 2, 1)
+    bucket = ((times - times[0]) / max(times[-1] - times[0], 1e-9) * buckets).astype(np.int64)
+    np.minimum(bucket, buckets - 1, out=bucket)
+    # Sort by (bucket, value): first of each bucket is its min, last is its max
+    order = np.lexsort((values, bucket))
+    starts = np.flatnonzero(np.r_[True, np.diff(bucket[order]) != 0])
+    ends = np.r_[starts[1:], n] - 1
+    picked = np.unique(np.concatenate([order[starts], order[ends]]))
+    return times[picked], values[picked]
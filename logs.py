@@ -0,0 +1,105 @@
+"""
+Queue Backed Logging
+
+Keeps log I/O off the ingest and broadcast threads:
+- Handlers only enqueue the record, a QueueListener thread formats and
+  writes it
+- plain format keeps the emoji console lines, json writes one object per
+  line with the record's structured fields
+- SampledLog lets through a fixed number of per-message lines per second
+  and per key, and reports how many it skipped, so log volume stays flat
+  as message rate and client count grow
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+LOGGER_NAME = "plant"
+LOG_FORMATS = ("plain", "json")
+DEFAULT_SAMPLE_PER_SECOND = 5
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue the record untouched, formatting happens on the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and its fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_format="plain", level=logging.INFO, stream=None):
+    """Route the plant logger through a queue to one background writer"""
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter("%(message)s"))
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers[:] = [DeferredQueueHandler(records)]
+    logger.setLevel(level)
+    logger.propagate = False
+    return listener
+
+
+class SampledLog:
+    """At most per_second records per key and second, the next one carries the skipped count"""
+
+    def __init__(self, logger, per_second=DEFAULT_SAMPLE_PER_SECOND):
+        self.logger = logger
+        self.per_second = per_second
+        self._windows = {}  # key -> [window start, records let through, skipped]
+
+    def allow(self, key):
+        """Skipped count since the last record for key if this one may be logged, else None"""
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= 1.0:
+            skipped = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            return skipped
+        if window[1] < self.per_second:
+            window[1] += 1
+            skipped, window[2] = window[2], 0
+            return skipped
+        window[2] += 1
+        return None
+
+    def log(self, level, key, message, *args, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        skipped = self.allow(key)
+        if skipped is None:
+            return
+        if skipped:
+            message += " (+%d similar skipped)"
+            args += (skipped,)
+            fields['skipped'] = skipped
+        self.logger.log(level, message, *args, extra={'fields': fields})
+
+    def info(self, key, message, *args, **fields):
+        self.log(logging.INFO, key, message, *args, **fields)
+
+    def warning(self, key, message, *args, **fields):
+        self.log(logging.WARNING, key, message, *args, **fields)
@@ -0,0 +1,243 @@
+"""
+Server Metrics
+
+Low overhead instrumentation for the ingest and broadcast paths:
+- Counter, Gauge and Histogram with optional labels, rendered in the
+  Prometheus text format by Registry.render() (served at /metrics)
+- Histograms use fixed buckets, an observation is one bisect + two adds
+- SampledProfiler runs cProfile on a sampled fraction of calls for a
+  limited time, switched on at runtime (/debug/profile)
+"""
+import bisect
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+
+# Seconds: 10us .. 2.5s, covers a single handler call up to a slow fan-out
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    """Base for labelled metrics: one child per label value combination"""
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._children[()] = self._new_child()
+
+    def labels(self, **values):
+        """Child for one label combination, keep a reference to it on hot paths"""
+        key = tuple(str(values[name]) for name in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """(suffix, label text, value) for every exposed sample"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {value}")
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield "_total", _label_text(self.label_names, key), child.value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        self._children[()].dec(amount)
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield "", _label_text(self.label_names, key), child.value
+
+
+class _Buckets:
+    __slots__ = ('bounds', 'counts', 'sum', 'lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the duration of its block"""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('target', 'started')
+
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.started)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                yield "_bucket", _label_text(self.label_names + ('le',), key + (le,)), cumulative
+            yield "_sum", _label_text(self.label_names, key), total
+            yield "_count", _label_text(self.label_names, key), cumulative
+
+
+class Registry:
+    """Every metric of the process, rendered together for /metrics"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+class SampledProfiler:
+    """cProfile over a random fraction of calls, active for a limited time"""
+
+    def __init__(self):
+        self.profile = None
+        self.rate = 0.0
+        self.until = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def start(self, seconds, rate):
+        """Profile roughly rate of the calls for the next seconds, discarding older samples"""
+        with self._lock:
+            self.profile = cProfile.Profile()
+            self.rate = rate
+            self.calls = 0
+            self.until = time.time() + seconds
+
+    @property
+    def active(self):
+        return self.until > time.time()
+
+    def call(self, function, *args):
+        """Run function(*args), under the profiler if this call is sampled"""
+        if not self.until or not self.active or random.random() >= self.rate:
+            return function(*args)
+        # One profiled call at a time, concurrent ones just run
+        if not self._lock.acquire(blocking=False):
+            return function(*args)
+        try:
+            self.calls += 1
+            return self.profile.runcall(function, *args)
+        finally:
+            self._lock.release()
+
+    def report(self, limit=30, sort='cumulative'):
+        """pstats text of the samples collected so far"""
+        with self._lock:
+            if self.profile is None or not self.calls:
+                return "No samples collected\n"
+            out = io.StringIO()
+            state = "running" if self.active else "finished"
+            out.write(f"{self.calls} sampled calls ({state}, rate {self.rate})\n")
+            pstats.Stats(self.profile, stream=out).sort_stats(sort).print_stats(limit)
+            return out.getvalue()
@@ -0,0 +1,82 @@
+"""
+Asyncio MQTT Driver
+
+Runs a paho-mqtt client on an asyncio event loop instead of the thread
+started by loop_start():
+- The broker socket is watched with loop.add_reader/add_writer, so
+  on_message callbacks run on the event loop thread
+- loop_misc (keepalive pings, retries) runs as a once-a-second task
+- The blocking TCP connect runs in a thread, so an unreachable broker
+  never stalls the loop (or the HTTP server sharing it)
+- Failed and dropped connections are retried with exponential backoff,
+  reset once a connection is established
+"""
+import asyncio
+import logging
+import socket
+import threading
+import paho.mqtt.client as mqtt
+
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 60
+
+log = logging.getLogger("plant.mqtt")
+
+
+class AsyncioMqtt:
+    """Drives one paho client from the running event loop"""
+
+    def __init__(self, client, min_delay=RECONNECT_MIN_SECONDS, max_delay=RECONNECT_MAX_SECONDS):
+        self.client = client
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.loop = None
+        self._loop_thread = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def _on_loop(self, function, *args):
+        """Call now on the loop thread, or hand it over from the connect thread"""
+        if threading.get_ident() == self._loop_thread:
+            function(*args)
+        else:
+            self.loop.call_soon_threadsafe(function, *args)
+
+    def on_socket_open(self, client, userdata, sock):
+        self._on_loop(self.loop.add_reader, sock, client.loop_read)
+
+    def on_socket_close(self, client, userdata, sock):
+        self._on_loop(self.loop.remove_reader, sock)
+        self._on_loop(self.loop.remove_writer, sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self._on_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self._on_loop(self.loop.remove_writer, sock)
+
+    async def run(self, host, port, keepalive=60):
+        """Connect and keep the connection serviced, reconnecting after drops"""
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        delay = self.min_delay
+        while True:
+            try:
+                # Resolve without blocking the loop, the TCP connect happens in a thread
+                infos = await self.loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+                await asyncio.to_thread(self.client.connect, infos[0][4][0], port, keepalive)
+            except OSError as e:
+                log.error("❌ MQTT connection error: %s, retrying in %ss", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_delay)
+                continue
+
+            while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                if self.client.is_connected():
+                    delay = self.min_delay
+                await asyncio.sleep(1)
+            log.warning("⚠️ MQTT connection lost, reconnecting in %ss", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_delay)
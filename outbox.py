@@ -0,0 +1,270 @@
+"""
+Per-Client Outboxes
+
+Bounded send queues between the broadcasts and each viewer's socket:
+- A Socket.IO client manager (python-socketio's extension point for
+  room fan-out), so Flask-SocketIO and the asyncio server share it
+- While a client's Engine.IO queue holds fewer than high_water packets
+  messages go straight to it; past that they wait in the client's outbox
+  and are pumped in as the client catches up
+- Latest-wins events (moisture_update) keep one pending message per key
+  (the device), a newer one replaces the older and counts as dropped
+- Ordered events (tap_event) are never dropped; a client with more than
+  max_ordered of them waiting is disconnected
+"""
+import threading
+from collections import deque
+from socketio import AsyncManager, Manager, packet
+from engineio import packet as eio_packet
+
+DEFAULT_HIGH_WATER = 32
+DEFAULT_MAX_ORDERED = 256
+PUMP_SECONDS = 0.05
+
+
+class ClientOutbox:
+    __slots__ = ('sid', 'latest', 'ordered', 'dropped', 'sent')
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.latest = {}
+        self.ordered = deque()
+        self.dropped = 0
+        self.sent = 0
+
+    def __len__(self):
+        return len(self.latest) + len(self.ordered)
+
+
+class Outboxes:
+    """Outbox bookkeeping per Engine.IO session, safe to share between threads"""
+
+    def __init__(self, latest_wins, ordered, high_water=DEFAULT_HIGH_WATER, max_ordered=DEFAULT_MAX_ORDERED,
+                 on_drop=None, on_overflow=None):
+        self.latest_wins = dict(latest_wins)  # event -> payload field naming the key
+        self.ordered = frozenset(ordered)
+        self.high_water = high_water
+        self.max_ordered = max_ordered
+        self.on_drop = on_drop
+        self.on_overflow = on_overflow
+        self.dropped = 0
+        self.overflowed = 0
+        self._boxes = {}
+        self.lock = threading.Lock()
+
+    def handles(self, event):
+        return event in self.latest_wins or event in self.ordered
+
+    def put(self, eio_sid, sid, event, data, packets, queued):
+        """Queue packets for one client (queued: its Engine.IO queue size),
+        returns the packets to send now, or None once the client overflowed"""
+        box = self._boxes.get(eio_sid)
+        if box is None:
+            if queued < self.high_water:
+                return packets  # Keeping up, no outbox needed
+            box = self._boxes[eio_sid] = ClientOutbox(sid)
+        if event in self.ordered:
+            box.ordered.append(packets)
+            if len(box.ordered) > self.max_ordered:
+                del self._boxes[eio_sid]
+                self.overflowed += 1
+                if self.on_overflow:
+                    self.on_overflow()
+                return None
+        else:
+            key = data.get(self.latest_wins[event]) if isinstance(data, dict) else None
+            if box.latest.pop((event, key), None) is not None:
+                box.dropped += 1
+                self.dropped += 1
+                if self.on_drop:
+                    self.on_drop()
+            box.latest[(event, key)] = packets
+        return self.take(eio_sid, queued)
+
+    def take(self, eio_sid, queued):
+        """Packets a client has room for, in order: ordered events, then the latest per key"""
+        box = self._boxes.get(eio_sid)
+        if box is None:
+            return []
+        free = self.high_water - queued
+        out = []
+        while free > 0 and box.ordered:
+            out.extend(box.ordered.popleft())
+            free -= 1
+        while free > 0 and box.latest:
+            out.extend(box.latest.pop(next(iter(box.latest))))
+            free -= 1
+        box.sent += len(out)
+        if not box:
+            del self._boxes[eio_sid]
+        return out
+
+    def waiting(self):
+        """Engine.IO sessions with messages in their outbox"""
+        return list(self._boxes)
+
+    def forget(self, eio_sid):
+        self._boxes.pop(eio_sid, None)
+
+    def stats(self, queue_size, limit=20):
+        """Totals and the clients with the most messages waiting, queue_size(eio_sid) -> int"""
+        with self.lock:
+            rows = [{'sid': box.sid, 'outbox': len(box), 'ordered': len(box.ordered), 'latest': len(box.latest),
+                     'dropped': box.dropped, 'sent': box.sent, 'queued': queue_size(eio_sid)}
+                    for eio_sid, box in list(self._boxes.items())]
+        rows.sort(key=lambda row: (row['ordered'], row['outbox'], row['queued']), reverse=True)
+        return {
+            'slow_clients': len(rows),
+            'dropped': self.dropped,
+            'overflow_disconnects': self.overflowed,
+            'high_water': self.high_water,
+            'max_ordered': self.max_ordered,
+            'clients': rows[:limit],
+        }
+
+
+def encode_event(server, event, data, namespace):
+    """Engine.IO packets of one event, built once and sendable to any number of clients"""
+    if isinstance(data, tuple):
+        data = list(data)
+    elif data is not None:
+        data = [data]
+    else:
+        data = []
+    encoded = server.packet_class(packet.EVENT, namespace=namespace, data=[event] + data).encode()
+    if not isinstance(encoded, list):
+        encoded = [encoded]
+    return [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded]
+
+
+def _queue_size(server, eio_sid):
+    socket = server.eio.sockets.get(eio_sid)
+    return socket.queue.qsize() if socket else 0
+
+
+class OutboxManager(Manager):
+    """Client manager of the threading server, emits of outbox events go through Outboxes"""
+
+    def __init__(self, outboxes):
+        super().__init__()
+        self.outboxes = outboxes
+
+    def initialize(self):
+        super().initialize()
+        self.server.start_background_task(self._pump_forever)
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        if callback or not self.outboxes.handles(event):
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback,
+                                to=to, **kwargs)
+        if namespace not in self.rooms:
+            return
+        packets = encode_event(self.server, event, data, namespace)
+        skip = skip_sid if isinstance(skip_sid, list) else [skip_sid]
+        for sid, eio_sid in self.get_participants(namespace, to or room):
+            if sid in skip:
+                continue
+            # Held while sending too, so concurrent emits can't reorder a client's ordered events
+            with self.outboxes.lock:
+                ready = self.outboxes.put(eio_sid, sid, event, data, packets, _queue_size(self.server, eio_sid))
+                for p in ready or ():
+                    self.server._send_eio_packet(eio_sid, p)
+            if ready is None:
+                self._drop(eio_sid)
+
+    def send_encoded(self, sid, namespace, packets):
+        """Send packets from encode_event to one client"""
+        eio_sid = self.eio_sid_from_sid(sid, namespace)
+        with self.outboxes.lock:
+            for p in packets:
+                self.server._send_eio_packet(eio_sid, p)
+
+    def _drop(self, eio_sid):
+        socket = self.server.eio.sockets.get(eio_sid)
+        if socket:
+            # No wait for the queue to drain, this client is not draining it
+            socket.close(wait=False, abort=True)
+
+    def pump(self):
+        """Move waiting messages into the clients that made room for them"""
+        for eio_sid in self.outboxes.waiting():
+            with self.outboxes.lock:
+                if eio_sid not in self.server.eio.sockets:
+                    self.outboxes.forget(eio_sid)
+                    continue
+                for p in self.outboxes.take(eio_sid, _queue_size(self.server, eio_sid)):
+                    self.server._send_eio_packet(eio_sid, p)
+
+    def _pump_forever(self):
+        while True:
+            self.server.sleep(PUMP_SECONDS)
+            self.pump()
+
+    def disconnect(self, sid, namespace, **kwargs):
+        eio_sid = self.eio_sid_from_sid(sid, namespace)
+        with self.outboxes.lock:
+            self.outboxes.forget(eio_sid)
+        return super().disconnect(sid, namespace, **kwargs)
+
+    def stats(self, limit=20):
+        return self.outboxes.stats(lambda eio_sid: _queue_size(self.server, eio_sid), limit)
+
+
+class AsyncOutboxManager(AsyncManager):
+    """Client manager of the asyncio server, same policy as OutboxManager"""
+
+    def __init__(self, outboxes):
+        super().__init__()
+        self.outboxes = outboxes
+
+    def initialize(self):
+        super().initialize()
+        self.server.start_background_task(self._pump_forever)
+
+    async def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        if callback or not self.outboxes.handles(event):
+            return await super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback,
+                                      to=to, **kwargs)
+        if namespace not in self.rooms:
+            return
+        packets = encode_event(self.server, event, data, namespace)
+        skip = skip_sid if isinstance(skip_sid, list) else [skip_sid]
+        for sid, eio_sid in self.get_participants(namespace, to or room):
+            if sid in skip:
+                continue
+            ready = self.outboxes.put(eio_sid, sid, event, data, packets, _queue_size(self.server, eio_sid))
+            if ready is None:
+                await self._drop(eio_sid)
+                continue
+            for p in ready:
+                await self.server._send_eio_packet(eio_sid, p)
+
+    async def send_encoded(self, sid, namespace, packets):
+        eio_sid = self.eio_sid_from_sid(sid, namespace)
+        for p in packets:
+            await self.server._send_eio_packet(eio_sid, p)
+
+    async def _drop(self, eio_sid):
+        socket = self.server.eio.sockets.get(eio_sid)
+        if socket:
+            await socket.close(wait=False, abort=True)
+
+    async def pump(self):
+        for eio_sid in self.outboxes.waiting():
+            if eio_sid not in self.server.eio.sockets:
+                self.outboxes.forget(eio_sid)
+                continue
+            for p in self.outboxes.take(eio_sid, _queue_size(self.server, eio_sid)):
+                await self.server._send_eio_packet(eio_sid, p)
+
+    async def _pump_forever(self):
+        while True:
+            await self.server.sleep(PUMP_SECONDS)
+            await self.pump()
+
+    async def disconnect(self, sid, namespace, **kwargs):
+        self.outboxes.forget(self.eio_sid_from_sid(sid, namespace))
+        return await super().disconnect(sid, namespace, **kwargs)
+
+    def stats(self, limit=20):
+        return self.outboxes.stats(lambda eio_sid: _queue_size(self.server, eio_sid), limit)
@@ -1,10 +1,29 @@
+"""
+MQTT Receiver
+
+python receiver.py [print]            pretty-print live messages
+python receiver.py record DIR         record every message (recording.py format)
+python receiver.py replay DIR         republish a recording with its original timing
+
+Replaying a recorded spike against a local broker reproduces production
+traffic for server.py offline, --speed 10 replays it ten times faster.
+"""
+import argparse
+import os
+import signal
+import time
 import paho.mqtt.client as mqtt
 from datetime import datetime
+from sensor_payload import is_batch, decode_batch
+from recording import RecordingWriter, read_recording, DEFAULT_MAX_BYTES
 
-BROKER = "broker.hivemq.com"  # match your ESP32
-PORT = 1883
+BROKER = os.environ.get("MQTT_BROKER", "broker.hivemq.com")  # match your ESP32
+PORT = int(os.environ.get("MQTT_PORT", 1883))
 TOPIC = "murad/vase/#"
 
+FLUSH_SECONDS = 1
+STATUS_SECONDS = 10
+
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
         print("✅ Connected to MQTT broker!")
@@ -16,16 +35,111 @@ def on_connect(client, userdata, flags, rc):
 def on_message(client, userdata, msg):
     t = datetime.now().strftime("%H:%M:%S")
     topic = msg.topic
-    payload = msg.payload.decode()
+    if is_batch(msg.payload):
+        try:
+            batch = decode_batch(msg.payload)
+        except ValueError as e:
+            print(f"\033[91m[{t}] ⚠️ Bad batch -> {e}\033[0m")
+            return
+        values = batch.values
+        if len(values):
+            print(f"\033[92m[{t}] 📦 Batch -> {len(values)} readings over {batch.times[-1] - batch.times[0]:.2f}s, "
+                  f"min {values.min()} max {values.max()} last {values[-1]}\033[0m")
+        return
+    payload = msg.payload.decode(errors='replace')
     if "events" in topic:
         print(f"\033[93m[{t}] 💥 TAP -> {payload}\033[0m")
     else:
         print(f"\033[92m[{t}] 🌿 Moisture -> {payload}\033[0m")
 
-client = mqtt.Client()
-client.on_connect = on_connect
-client.on_message = on_message
+def connect(client):
+    print(f"Connecting to broker {BROKER}:{PORT} ...")
+    client.connect(BROKER, PORT, 60)
+
+def run_print():
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    connect(client)
+    client.loop_forever()
 
-print(f"Connecting to broker {BROKER}:{PORT} ...")
-client.connect(BROKER, PORT, 60)
-client.loop_forever()
+def run_record(directory, max_bytes):
+    """Write every message to disk, the paho thread only appends to a buffer"""
+    writer = RecordingWriter(directory, max_bytes)
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = lambda client, userdata, msg: writer.write(msg.topic, msg.payload)
+    connect(client)
+    client.loop_start()
+    print(f"⏺️  Recording to {directory} (rotating at {max_bytes // (1024 * 1024)} MB)")
+    last_status = time.monotonic()
+    try:
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            writer.flush()
+            if time.monotonic() - last_status >= STATUS_SECONDS:
+                last_status = time.monotonic()
+                print(f"⏺️  {writer.messages} messages in {writer.files} files")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        writer.close()
+        print(f"💾 Recorded {writer.messages} messages in {writer.files} files")
+
+def run_replay(path, speed):
+    """Republish a recording, message i goes out at (t_i - t_0) / speed after the start"""
+    client = mqtt.Client()
+    connect(client)
+    client.loop_start()
+    sent = 0
+    worst_lag = 0.0
+    started = first = None
+    try:
+        for timestamp, topic, payload in read_recording(path):
+            if first is None:
+                first, started = timestamp, time.perf_counter()
+                print(f"▶️  Replaying {path} at {speed:g}x")
+            due = started + (timestamp - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                worst_lag = max(worst_lag, -delay)
+            client.publish(topic, payload)
+            sent += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+    if started is None:
+        print(f"⚠️ No messages in {path}")
+        return
+    elapsed = time.perf_counter() - started
+    print(f"✅ Replayed {sent} messages in {elapsed:.1f}s ({sent / max(elapsed, 1e-9):.0f} msg/s), "
+          f"worst lag behind schedule {worst_lag * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print, record or replay the plant MQTT traffic")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("print", help="pretty-print live messages (default)")
+    record = commands.add_parser("record", help="record every message to DIR")
+    record.add_argument("directory")
+    record.add_argument("--max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="rotate files at this size")
+    replay = commands.add_parser("replay", help="republish a recording (DIR or one file)")
+    replay.add_argument("path")
+    replay.add_argument("--speed", type=float, default=1.0, help="1 = original timing, 10 = ten times faster")
+    args = parser.parse_args()
+    if args.command == "replay" and args.speed <= 0:
+        parser.error("--speed must be positive")
+    # Stop cleanly (flush, close the current file) when killed, not only on Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    if args.command == "record":
+        run_record(args.directory, args.max_mb * 1024 * 1024)
+    elif args.command == "replay":
+        run_replay(args.path, args.speed)
+    else:
+        run_print()
@@ -0,0 +1,132 @@
+"""
+MQTT Recordings
+
+Captures raw broker traffic so it can be replayed against server.py:
+- Append-only binary files, written through a large buffer and rotated
+  once they pass a size limit
+- Each file starts with 'PGRC' + uint8 version, then one record per
+  message: float64 receive time | uint16 topic id | uint32 payload length
+  | payload. A topic id seen for the first time in a file is followed by
+  uint16 length + the topic, so repeated topics cost 2 bytes
+- Files are self-contained and named so that sorting them by name puts
+  them in recording order; a file is also rotated once its topic ids
+  run out (MAX_TOPICS)
+"""
+import struct
+import threading
+import time
+from pathlib import Path
+
+RECORDING_MAGIC = b'PGRC'
+RECORDING_VERSION = 1
+FILE_HEADER = struct.Struct('<4sB')
+RECORD_HEADER = struct.Struct('<dHI')
+TOPIC_HEADER = struct.Struct('<H')
+SUFFIX = ".pgrec"
+MAX_TOPICS = 1 << 16  # topic ids are uint16
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+BUFFER_BYTES = 1024 * 1024
+
+
+class RecordingWriter:
+    """Appends messages to size-rotated files in a directory (one writer per directory),
+    safe to write from one thread while another flushes or closes"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.messages = 0
+        self.files = 0
+        self._file = None
+        self._size = 0
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def _rotate(self):
+        self._close()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = self.directory / f"{stamp}-{self.files:05d}{SUFFIX}"
+        self._file = open(path, 'wb', buffering=BUFFER_BYTES)
+        self._file.write(FILE_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION))
+        self._size = FILE_HEADER.size
+        self._topics = {}
+        self.files += 1
+        return path
+
+    def write(self, topic, payload, timestamp=None):
+        """Record one message, payload as bytes"""
+        with self._lock:
+            self._write(topic, payload, timestamp)
+
+    def _write(self, topic, payload, timestamp):
+        if self._file is None or self._size >= self.max_bytes or (
+                topic not in self._topics and len(self._topics) >= MAX_TOPICS):
+            self._rotate()
+        topic_id = self._topics.get(topic)
+        new_topic = topic_id is None
+        if new_topic:
+            topic_id = self._topics[topic] = len(self._topics)
+        record = RECORD_HEADER.pack(time.time() if timestamp is None else timestamp, topic_id, len(payload))
+        if new_topic:
+            encoded = topic.encode()
+            record += TOPIC_HEADER.pack(len(encoded)) + encoded
+        self._file.write(record)
+        self._file.write(payload)
+        self._size += len(record) + len(payload)
+        self.messages += 1
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def recording_files(path):
+    """Recording files under a directory (or the file itself) in recording order"""
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    return sorted(path.glob(f"*{SUFFIX}"))
+
+
+def read_file(path):
+    """Yields (timestamp, topic, payload) from one recording file, stops at a truncated tail"""
+    data = Path(path).read_bytes()
+    if len(data) < FILE_HEADER.size:
+        return
+    magic, version = FILE_HEADER.unpack_from(data)
+    if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+        raise ValueError(f"{path}: not a version {RECORDING_VERSION} recording")
+    topics = []
+    offset = FILE_HEADER.size
+    while offset + RECORD_HEADER.size <= len(data):
+        timestamp, topic_id, length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        if topic_id == len(topics):
+            if offset + TOPIC_HEADER.size > len(data):
+                return
+            (topic_length,) = TOPIC_HEADER.unpack_from(data, offset)
+            offset += TOPIC_HEADER.size
+            topics.append(data[offset:offset + topic_length].decode())
+            offset += topic_length
+        if offset + length > len(data):
+            return  # the recorder was stopped mid-write
+        yield timestamp, topics[topic_id], data[offset:offset + length]
+        offset += length
+
+
+def read_recording(path):
+    """Yields (timestamp, topic, payload) across every file of a recording"""
+    for file in recording_files(path):
+        yield from read_file(file)
@@ -1,4 +1,4 @@
 #!/bin/bash
 
 # Activate virtual environment and run server
-source venv/bin/activate && python server.py
+source venv/bin/activate && python server.py --dev
@@ -0,0 +1,59 @@
+"""
+Sensor Payloads
+
+Moisture messages come in two shapes:
+- Plain: one ASCII integer per message ("2048"), as the ESP32 sends today
+- Batch: many readings packed into one message, decoded with a single
+  np.frombuffer call
+
+Batch layout (little endian):
+  'PGSB' | uint8 version | uint8 device id length | float64 base timestamp
+  | float32 sample interval (s) | uint16 count | device id (UTF-8)
+  | padding to an even offset | uint16 readings[count]
+Reading i was taken at base timestamp + i * interval. An empty device id
+means "the device in the topic".
+"""
+import math
+import struct
+from collections import namedtuple
+import numpy as np
+
+BATCH_MAGIC = b'PGSB'
+BATCH_VERSION = 1
+BATCH_HEADER = struct.Struct('<4sBBdfH')
+READING_DTYPE = np.dtype('<u2')
+
+Batch = namedtuple('Batch', 'device times values')
+
+
+def is_batch(payload):
+    """True if a raw MQTT payload is a packed batch rather than a plain integer"""
+    return payload[:4] == BATCH_MAGIC
+
+
+def encode_batch(values, base_timestamp, interval, device=""):
+    """Pack readings into a batch payload (what a batching ESP32 would send)"""
+    values = np.asarray(values, dtype=READING_DTYPE)
+    name = device.encode()
+    header = BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, len(name), base_timestamp, interval, len(values)) + name
+    header += b'\0' * (len(header) % 2)
+    return header + values.tobytes()
+
+
+def decode_batch(payload):
+    """Unpack a batch payload, raises ValueError if it is malformed"""
+    if len(payload) < BATCH_HEADER.size:
+        raise ValueError("batch shorter than its header")
+    magic, version, name_length, base, interval, count = BATCH_HEADER.unpack_from(payload)
+    if magic != BATCH_MAGIC or version != BATCH_VERSION:
+        raise ValueError(f"unsupported batch version {version}")
+    offset = BATCH_HEADER.size + name_length
+    device = bytes(payload[BATCH_HEADER.size:offset]).decode()
+    offset += offset % 2
+    if len(payload) < offset + count * READING_DTYPE.itemsize:
+        raise ValueError(f"batch truncated, expected {count} readings")
+    if not (math.isfinite(base) and math.isfinite(interval) and interval >= 0):
+        raise ValueError(f"bad batch timing: base {base}, interval {interval}")
+    values = np.frombuffer(payload, dtype=READING_DTYPE, count=count, offset=offset)
+    times = base + np.arange(count, dtype=np.float64) * interval
+    return Batch(device, times, values)
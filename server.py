@@ -6,147 +6,935 @@ Real-time moisture monitoring with animated guardian
 - Moisture > 1500 (50%): Guardian stays alive  
 - Moisture <= 1500 (50%): Guardian dies
 - Tap event: Guardian swipes to defend the plant
+
+Modes (python server.py --mode threading|async):
+- threading: Flask-SocketIO, paho network loop in its own thread
+- async: MQTT, state updates and Socket.IO broadcast on one asyncio
+  event loop (python-socketio AsyncServer under uvicorn)
+- --workers N: this process keeps the one MQTT subscription and the
+  state, N async worker processes share the port (SO_REUSEPORT) and
+  serve the viewers, fed over a Unix socket bus (bus.py) with the
+  device table in shared memory
 """
 
-from flask import Flask, render_template, send_from_directory
-from flask_socketio import SocketIO, emit
+from flask import Flask, make_response, redirect, render_template, jsonify, request, url_for
+from flask_socketio import SocketIO, join_room, ConnectionRefusedError
 import paho.mqtt.client as mqtt
 from pathlib import Path
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs
 import webbrowser
 from threading import Timer
+import numpy as np
+from coalescer import UpdateCoalescer
+from taps import TapAggregator
+from outbox import Outboxes, OutboxManager, AsyncOutboxManager, encode_event
+from admission import ConnectLimiter
+from devices import DeviceTable, SharedDeviceTable, DEFAULT_DEVICE, MESSAGE_KINDS, parse_topic
+from history import HistoryStore, DOWNSAMPLE_METHODS
+from assets import AssetServer
+from texture_pipeline import TextureCatalog, FORMAT_MIMETYPES, DEFAULT_QUALITY
+from shared_library import LIBRARY_DIR_NAME
+from metrics import Registry, SampledProfiler
+from sensor_payload import is_batch, decode_batch
+from filters import FilterBank, FILTER_METHODS
+from calibration import CalibrationBank, linear_profile, RAW_MAX
+from logs import setup_logging, SampledLog, LOGGER_NAME, LOG_FORMATS, DEFAULT_SAMPLE_PER_SECOND
 
-# MQTT Configuration
-BROKER = "broker.hivemq.com"
-PORT = 1883
+# MQTT Configuration (MQTT_BROKER / MQTT_PORT point it at a local broker, e.g. bench/broker.py)
+BROKER = os.environ.get("MQTT_BROKER", "broker.hivemq.com")
+PORT = int(os.environ.get("MQTT_PORT", 1883))
 TOPIC = "murad/vase/#"
+MQTT_RECONNECT_MIN_SECONDS = 1  # reconnects back off exponentially up to the max
+MQTT_RECONNECT_MAX_SECONDS = 60
+
+# Web server
+HOST = "0.0.0.0"
+HTTP_PORT = int(os.environ.get("HTTP_PORT", 5000))
+SOCKET_TRANSPORTS = ['websocket', 'polling']
+
+# Multi-process mode (--workers): ingest -> workers event bus; the ingest process
+# serves its own counters, stats and profiler on a localhost-only admin port
+BUS_PATH = Path(os.environ.get("BUS_PATH", Path(tempfile.gettempdir()) / f"plant-guardian-{HTTP_PORT}.sock"))
+WORKER_RESTART_SECONDS = 1
+ADMIN_HOST = "127.0.0.1"
+ADMIN_PORT = int(os.environ.get("ADMIN_PORT", HTTP_PORT + 1))
+
+# Moisture thresholds (0-4095 range) of the default linear calibration
+MOISTURE_THRESHOLD = 1500
+HYSTERESIS_BAND = 100
+
+# Calibration: per-device raw -> percent profiles with their threshold and band,
+# compiled into lookup tables and reloaded when the file changes (calibration.py)
+CALIBRATION_CONFIG = Path(os.environ.get("CALIBRATION_CONFIG", Path(__file__).parent / "calibration.json"))
+
+# Noise filtering: alive/dead follows the filtered reading, with hysteresis of
+# +-band around the calibrated threshold (per-device overrides in filters.json)
+FILTER_CONFIG = Path(os.environ.get("FILTER_CONFIG", Path(__file__).parent / "filters.json"))
+
+# Broadcast coalescing: latest reading per sensor is flushed at this rate
+UPDATE_FLUSH_HZ = 10
+
+# Tap bursts: taps less than TAP_WINDOW_SECONDS apart go out as one tap_event
+# (with a count), a burst is cut after TAP_MAX_BURST_SECONDS
+TAP_WINDOW_SECONDS = 0.3
+TAP_MAX_BURST_SECONDS = 2.0
 
-# Moisture thresholds (0-4095 range)
-MOISTURE_THRESHOLD = 1500  # 50% threshold
+# Per-client send queues: past SEND_QUEUE_HIGH_WATER packets buffered for a
+# client, moisture_update waits latest-wins per device and tap_event in order,
+# a client with more than TAP_QUEUE_MAX taps waiting is disconnected
+SEND_QUEUE_HIGH_WATER = 32
+TAP_QUEUE_MAX = 256
+
+# Connection admission (per serving process): at most CONNECT_RATE new connections
+# per second in bursts of CONNECT_BURST, refused clients get a jittered retry_after
+CONNECT_RATE = 50
+CONNECT_BURST = 100
+
+# Per-device state: table size and how many device rooms one client may join
+MAX_DEVICES = 1024
+MAX_ROOMS_PER_CLIENT = 16
+
+# Moisture history: recent readings per device in memory, everything on disk
+HISTORY_DIR = Path(os.environ.get("HISTORY_DIR", Path(__file__).parent / "history"))
+HISTORY_RING_SIZE = 8192
+HISTORY_FLUSH_SECONDS = 5
+HISTORY_DEFAULT_POINTS = 500
+HISTORY_MAX_POINTS = 5000
+
+# Batch timestamps come from the device clock: a batch reaching further back than
+# BATCH_MAX_AGE_SECONDS or ahead of server time by more than BATCH_CLOCK_SKEW_SECONDS
+# is re-anchored to end now (readings older than the stored history are raised to its
+# newest timestamp by the history store)
+BATCH_MAX_AGE_SECONDS = 3600
+BATCH_CLOCK_SKEW_SECONDS = 5
+
+# Model assets: compressed variants are cached on disk, browsers revalidate hourly
+ASSETS_DIR = Path(__file__).parent / "web_assets"
+ASSET_CACHE_DIR = Path(__file__).parent / ".asset_cache"
+ASSET_MAX_AGE = 3600
+
+# Viewer: model shown on load, its files are preloaded from the page head
+DEFAULT_MODEL = "zombie"
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'plant-guardian-secret'
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', logger=True, engineio_logger=True)
+
+# Logging goes through a queue (see logs.py), per-message lines are sampled
+log = logging.getLogger(LOGGER_NAME)
+sampled_log = SampledLog(log)
 
 # Global state
-current_moisture = 0
-is_alive = True
+readiness = {'mqtt_connected': False, 'first_reading': None}  # /readyz
+readiness_listener = None  # called with readiness on every change (--workers: the bus)
+ingest_admin = None  # --workers viewer processes: base URL of the ingest process's admin listener
+devices = DeviceTable(capacity=MAX_DEVICES)
+calibration = CalibrationBank(CALIBRATION_CONFIG, linear_profile(MOISTURE_THRESHOLD, HYSTERESIS_BAND))
+filters = FilterBank.from_file(calibration, FILTER_CONFIG, capacity=MAX_DEVICES)
+coalescer = UpdateCoalescer()
+taps = TapAggregator(TAP_WINDOW_SECONDS, TAP_MAX_BURST_SECONDS, capacity=MAX_DEVICES)
+history = HistoryStore(HISTORY_DIR, ring_size=HISTORY_RING_SIZE)
+assets = AssetServer(ASSETS_DIR, ASSET_CACHE_DIR, max_age=ASSET_MAX_AGE)
+textures = TextureCatalog(ASSETS_DIR)
+
+# Metrics (/metrics) and the runtime ingest profiler (/debug/profile)
+registry = Registry()
+MQTT_MESSAGES = registry.counter('plant_mqtt_messages', 'MQTT messages received', ['kind'])
+PARSE_FAILURES = registry.counter('plant_mqtt_parse_failures', 'Moisture payloads that are not integers or valid batches')
+SAMPLES = registry.counter('plant_moisture_samples', 'Moisture readings ingested, a batch counts each of its readings')
+INGEST_SECONDS = registry.histogram('plant_ingest_handler_seconds', 'Time to apply one MQTT message to the device state')
+FANOUT_SECONDS = registry.histogram('plant_emit_fanout_seconds', 'Time to emit one event to a device room', ['event'])
+CONNECTED_CLIENTS = registry.gauge('plant_connected_clients', 'Connected Socket.IO clients')
+TRANSITIONS = registry.counter('plant_transitions', 'Alive/dead state transitions', ['to'])
+OUTBOX_DROPS = registry.counter('plant_outbox_dropped', 'moisture_update messages replaced by a newer one before a slow client took them')
+CONNECTS = registry.counter('plant_connects', 'Socket.IO connection attempts', ['result'])
+RECONNECT_BURSTS = registry.counter('plant_reconnect_bursts', 'Connection bursts that hit the admission limit')
+OVERFLOW_DISCONNECTS = registry.counter('plant_outbox_overflow_disconnects', 'Clients disconnected with more than TAP_QUEUE_MAX tap events waiting')
+profiler = SampledProfiler()
+
+def client_outboxes():
+    """Per-client send queue policy, one instance per Socket.IO server"""
+    return Outboxes({'moisture_update': 'device'}, ('tap_event',), high_water=SEND_QUEUE_HIGH_WATER,
+                    max_ordered=TAP_QUEUE_MAX, on_drop=OUTBOX_DROPS.inc, on_overflow=OVERFLOW_DISCONNECTS.inc)
+
+def on_connect_burst(started):
+    """Reconnect burst start/end, from the connect limiter"""
+    if started:
+        RECONNECT_BURSTS.inc()
+        log.warning("🌊 Reconnect burst: over %g connects/s, spreading clients out", CONNECT_RATE)
+    else:
+        log.info("🌊 Reconnect burst over: %s", connect_limiter.stats())
+
+connect_limiter = ConnectLimiter(CONNECT_RATE, CONNECT_BURST, on_burst=on_connect_burst)
+
+client_manager = OutboxManager(client_outboxes())
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', client_manager=client_manager)
+
+# Label children bound once, the hot path only increments
+mqtt_messages = {kind: MQTT_MESSAGES.labels(kind=kind) for kind in MESSAGE_KINDS}
+emit_fanout = {event: FANOUT_SECONDS.labels(event=event) for event in ('moisture_update', 'tap_event')}
+transitions = {alive: TRANSITIONS.labels(to='alive' if alive else 'dead') for alive in (True, False)}
+connects = {result: CONNECTS.labels(result=result) for result in ('admitted', 'refused')}
+
+def moisture_update(device, value, alive, changed=False):
+    """Build the moisture_update payload for one device"""
+    return {
+        'device': device,
+        'value': value,
+        'percent': calibration.get(device).percent_of(value),
+        'alive': alive,
+        'changed': changed
+    }
+
+def set_ready(**changes):
+    """Update the readiness state and pass it on"""
+    readiness.update(changes)
+    if readiness_listener:
+        readiness_listener(dict(readiness))
 
 def on_mqtt_connect(client, userdata, flags, rc):
     """MQTT connection callback"""
     if rc == 0:
-        print("✅ Connected to MQTT broker!")
+        set_ready(mqtt_connected=True)
+        log.info("✅ Connected to MQTT broker!")
         client.subscribe(TOPIC)
-        print(f"📡 Subscribed to topic: {TOPIC}")
+        log.info("📡 Subscribed to topic: %s", TOPIC)
     else:
-        print("❌ Failed to connect, return code =", rc)
+        log.error("❌ Failed to connect, return code = %s", rc)
 
-def on_mqtt_message(client, userdata, msg):
-    """MQTT message callback"""
-    global current_moisture, is_alive
+def on_mqtt_disconnect(client, userdata, rc):
+    """MQTT disconnect callback, the client reconnects on its own"""
+    if readiness['mqtt_connected']:
+        log.warning("⚠️ MQTT connection lost (rc=%s), reconnecting", rc)
+    set_ready(mqtt_connected=False)
+
+def on_mqtt_connect_fail(client, userdata):
+    """Failed connect attempt in paho's thread (threading mode), retried with backoff"""
+    sampled_log.warning('connect_fail', "❌ MQTT connection to %s:%s failed, retrying", BROKER, PORT)
+
+def log_transition(device, value, alive):
+    """Alive/dead flips are always logged, plain readings are sampled"""
+    transitions[alive].inc()
+    log.info("%s [%s] %s: moisture %d (%.1f%%)", '🌱' if alive else '💀', device,
+             'came back to life' if alive else 'died', value, calibration.get(device).percent_of(value),
+             extra={'fields': {'device': device, 'value': value, 'alive': alive, 'transition': True}})
+
+def batch_times(times, now):
+    """Timestamps of a batch, re-anchored to server time when the device clock is off"""
+    if times[0] < now - BATCH_MAX_AGE_SECONDS or times[-1] > now + BATCH_CLOCK_SKEW_SECONDS:
+        return times + (now - times[-1])
+    return times
+
+def handle_batch(device, batch):
+    """Apply a packed batch of readings, returns (event, data, room) to emit now or None"""
+    count = len(batch.values)
+    if not count:
+        return None
+    if int(batch.values.max()) > RAW_MAX:
+        raise OverflowError(f"batch reading {int(batch.values.max())} outside 0-{RAW_MAX}")
+    devices.slot(device)
+    SAMPLES.inc(count)
+    _, alive = filters.push_many(device, batch.values)
+    value, is_alive = int(batch.values[-1]), bool(alive[-1])
+    times = batch_times(batch.times, time.time())
+    was_alive = devices.update(device, value, is_alive, float(times[-1]))
+    if readiness['first_reading'] is None:
+        set_ready(first_reading=float(times[-1]))
+    history.extend(device, times, batch.values)
     
-    topic = msg.topic
-    payload = msg.payload.decode()
+    # Every flip inside the batch, the first one against the state before it
+    for index in np.flatnonzero(np.diff(alive, prepend=was_alive)):
+        log_transition(device, int(batch.values[index]), bool(alive[index]))
     
-    if "events" in topic:
-        # Tap event
-        print(f"💥 TAP event received: {payload}")
-        socketio.emit('tap_event', {'data': payload}, namespace='/')
-        socketio.sleep(0)  # Allow emission to complete
-        print(f"📤 Emitted tap_event to all clients")
+    changed = was_alive != is_alive
+    update = moisture_update(device, value, is_alive, changed)
+    sampled_log.info('batch', "📦 Batch [%s]: %d readings, last %d (%.1f%%) - %s", device, count, value,
+                     update['percent'], 'Alive' if is_alive else 'Dead',
+                     device=device, count=count, value=value, alive=is_alive)
+    if coalescer.offer(device, update, urgent=changed):
+        return 'moisture_update', update, device
+    return None
+
+def handle_mqtt_message(topic, payload):
+    """Apply one MQTT message (raw payload bytes) to the device state, returns (event, data, room) to emit now or None"""
+    device, kind = parse_topic(topic)
+    mqtt_messages[kind].inc()
+    
+    if kind == "events":
+        # Tap event, broadcast once its burst is over
+        payload = payload.decode(errors='replace')
+        sampled_log.info('tap', "💥 TAP event received from %s: %s", device, payload, device=device, data=payload)
+        taps.offer(device, payload, time.time())
+        return None
         
     else:
-        # Moisture reading
+        # Moisture reading, or a packed batch of them
         try:
-            moisture_value = int(payload)
-            current_moisture = moisture_value
+            if is_batch(payload):
+                batch = decode_batch(payload)
+                return handle_batch(batch.device or device, batch)
             
-            # Calculate percentage (0-4095 range mapped to 0-100%)
-            moisture_percent = (moisture_value / 4095) * 100
+            moisture_value = int(payload)
+            if not 0 <= moisture_value <= RAW_MAX:
+                raise OverflowError(f"reading {moisture_value} outside 0-{RAW_MAX}")
+            # A device slot first (raises once the table is full), so the filter only ever sees kept readings
+            devices.slot(device)
+            now = time.time()
+            SAMPLES.inc()
             
-            # Determine if alive based on threshold
-            was_alive = is_alive
-            is_alive = moisture_value > MOISTURE_THRESHOLD
+            # Determine if alive from the filtered reading, with hysteresis around the threshold
+            _, is_alive = filters.push(device, moisture_value)
+            was_alive = devices.update(device, moisture_value, is_alive, now)
+            if readiness['first_reading'] is None:
+                set_ready(first_reading=now)
+            history.record(device, now, moisture_value)
+            changed = was_alive != is_alive
             
-            print(f"🌿 Moisture: {moisture_value} ({moisture_percent:.1f}%) - {'Alive' if is_alive else 'Dead'}")
+            update = moisture_update(device, moisture_value, is_alive, changed)
+            if changed:
+                log_transition(device, moisture_value, is_alive)
+            else:
+                sampled_log.info('moisture', "🌿 Moisture [%s]: %d (%.1f%%) - %s", device, moisture_value,
+                                 update['percent'], 'Alive' if is_alive else 'Dead',
+                                 device=device, value=moisture_value, alive=is_alive)
             
-            # Emit to all connected clients
-            socketio.emit('moisture_update', {
-                'value': moisture_value,
-                'percent': moisture_percent,
-                'alive': is_alive,
-                'changed': was_alive != is_alive
-            }, namespace='/')
-            socketio.sleep(0)  # Allow emission to complete
-            print(f"📤 Emitted moisture_update to all clients")
+            # State transitions go out right away, plain readings wait for the flush tick
+            if coalescer.offer(device, update, urgent=changed):
+                return 'moisture_update', update, device
             
-        except ValueError:
-            print(f"⚠️ Invalid moisture value: {payload}")
+        except ValueError as e:
+            PARSE_FAILURES.inc()
+            sampled_log.warning('invalid', "⚠️ Invalid moisture payload from %s: %s", device, e, device=device)
+        except OverflowError as e:
+            sampled_log.warning('overflow', "⚠️ Dropping reading from %s: %s", device, e, device=device)
+    return None
+
+def ingest(topic, payload):
+    """handle_mqtt_message, timed and, while switched on, sampled by the profiler"""
+    with INGEST_SECONDS.time():
+        return profiler.call(handle_mqtt_message, topic, payload)
+
+def on_mqtt_message(client, userdata, msg):
+    """MQTT message callback (threading mode, runs on paho's network thread)"""
+    outgoing = ingest(msg.topic, msg.payload)
+    if outgoing:
+        event, data, room = outgoing
+        with coalescer.emit_lock, emit_fanout[event].time():
+            socketio.emit(event, data, to=room, namespace='/')
+        socketio.sleep(0)  # Allow emission to complete
+        log.debug("📤 Emitted %s to room %s", event, room)
+
+def flush_updates():
+    """Background task: broadcast the latest pending reading per sensor and the finished tap bursts"""
+    interval = 1.0 / UPDATE_FLUSH_HZ
+    while True:
+        socketio.sleep(interval)
+        for device, seq, update in coalescer.drain():
+            with coalescer.emit_lock:
+                if not coalescer.current(device, seq):
+                    continue  # An alive/dead transition went out after this reading was queued
+                with emit_fanout['moisture_update'].time():
+                    socketio.emit('moisture_update', update, to=device, namespace='/')
+        for device, burst in taps.drain(time.time()):
+            with emit_fanout['tap_event'].time():
+                socketio.emit('tap_event', burst, to=device, namespace='/')
+
+def flush_history():
+    """Background task: push buffered history records to disk"""
+    while True:
+        socketio.sleep(HISTORY_FLUSH_SECONDS)
+        history.flush()
 
 # Initialize MQTT client
 mqtt_client = mqtt.Client()
 mqtt_client.on_connect = on_mqtt_connect
+mqtt_client.on_disconnect = on_mqtt_disconnect
+mqtt_client.on_connect_fail = on_mqtt_connect_fail
+mqtt_client.reconnect_delay_set(MQTT_RECONNECT_MIN_SECONDS, MQTT_RECONNECT_MAX_SECONDS)
 mqtt_client.on_message = on_mqtt_message
 
 @app.route('/')
 def index():
-    """Serve the plant guardian viewer page"""
-    return render_template('index.html')
+    """Serve the plant guardian viewer page with the asset manifest inlined"""
+    manifest = assets.manifest()
+    files = model_files()
+    asset_manifest = {
+        'models': {model: asset_url(name, manifest) for model, name in files.items()},
+        'clips': {model: clip_index_data(model, manifest) for model in files},
+    }
+    response = make_response(render_template(
+        'index.html', socket_transports=SOCKET_TRANSPORTS, asset_manifest=asset_manifest,
+        default_model=DEFAULT_MODEL, preload_urls=preload_urls(DEFAULT_MODEL, files, manifest, asset_manifest)))
+    # The page names the current asset versions, so it is always revalidated
+    response.cache_control.no_cache = True
+    return response
+
+def model_files():
+    """Asset per model: the .glb from gltf_optimize.py unless the .gltf is newer"""
+    files = {}
+    for gltf in ASSETS_DIR.glob('*.gltf'):
+        glb = gltf.with_suffix('.glb')
+        chosen = glb if glb.is_file() and glb.stat().st_mtime >= gltf.stat().st_mtime else gltf
+        files[gltf.stem] = chosen.name
+    return files
+
+def asset_url(name, manifest):
+    """URL of an asset under its fingerprinted (immutable) name when it has one"""
+    return url_for('serve_assets', filename=manifest['names'].get(name, name))
+
+def preload_urls(model, files, manifest, asset_manifest):
+    """What the viewer fetches first for a model: the model, the buffers it references, its clips
+
+    All of these are loaded with fetch(), so they match an as="fetch" preload. Images are
+    left out: GLTFLoader loads them through an <img> (TextureLoader) or an
+    ImageBitmapLoader fetch depending on the browser, and a preload matching neither
+    would download the texture twice."""
+    name = files.get(model)
+    if name is None:
+        return []
+    urls = [asset_url(name, manifest)]
+    urls += [asset_url(dependency, manifest) for dependency in manifest['dependencies'].get(name, [])
+             if Path(dependency).suffix == '.bin']
+    clips = asset_manifest['clips'].get(model)
+    if clips:
+        urls += [clip['url'] for clip in clips['clips']]
+    return urls
 
 @app.route('/web_assets/<path:filename>')
 def serve_assets(filename):
-    """Serve 3D model assets"""
-    assets_dir = Path(__file__).parent / "web_assets"
-    return send_from_directory(assets_dir, filename)
+    """Serve 3D model assets, fingerprinted names are cached forever"""
+    return assets.send(filename)
 
 @app.route('/static/web_assets/<path:filename>')
 def serve_static_assets(filename):
-    """Serve 3D model assets via static route"""
-    assets_dir = Path(__file__).parent / "web_assets"
-    return send_from_directory(assets_dir, filename)
+    """Old asset URLs, moved to /web_assets"""
+    return redirect(url_for('serve_assets', filename=filename), code=301)
+
+@app.route('/web_assets/textures/<name>')
+@app.route('/static/web_assets/textures/<name>')
+def serve_texture(name):
+    """Texture variant that fits the client: ?format=/texture_formats cookie/Accept header,
+    ?quality=/texture_quality cookie"""
+    if '.' in name:
+        # A concrete variant file
+        return assets.send(f"textures/{name}")
+    
+    requested = request.args.get('format')
+    formats = request.cookies.get('texture_formats')
+    if requested:
+        accepted = [requested]
+    elif formats:
+        # The page's feature test, image fetches from GLTFLoader only send Accept: */*
+        accepted = [fmt for fmt in formats.split(',') if fmt in FORMAT_MIMETYPES] + ['png']
+    else:
+        explicit = set(request.accept_mimetypes.values())
+        accepted = [fmt for fmt, mimetype in FORMAT_MIMETYPES.items() if mimetype in explicit] + ['png']
+    quality = request.args.get('quality') or request.cookies.get('texture_quality', DEFAULT_QUALITY)
+    
+    variant = textures.pick(name, accepted, quality)
+    if variant is None:
+        return jsonify({'error': f"No variant of texture {name} for {', '.join(accepted)}"}), 404
+    response = assets.send(f"textures/{variant}")
+    response.vary.update(['Accept', 'Cookie'])
+    return response
+
+@app.route('/api/clips/<model>')
+def clip_index(model):
+    """Lazy clip index of a model: its shared library entry, else its --split-clips chunks"""
+    index = clip_index_data(model, assets.manifest())
+    if index is None:
+        return jsonify({'error': f"No split clips for model {model}"}), 404
+    return jsonify(index)
+
+def clip_index_data(model, manifest):
+    """Clip index of a model with fingerprinted chunk URLs, None if its clips are not split"""
+    library_path = ASSETS_DIR / LIBRARY_DIR_NAME / f"{model}.json"
+    if library_path.is_file():
+        index = json.loads(library_path.read_text())
+        folder = LIBRARY_DIR_NAME
+    else:
+        index_path = ASSETS_DIR / f"{model}.clips" / "index.json"
+        if not index_path.is_file():
+            return None
+        index = json.loads(index_path.read_text())
+        folder = f"{model}.clips"
+    for clip in index['clips']:
+        clip['url'] = asset_url(f"{folder}/{clip['file']}", manifest)
+    return index
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Counters and histograms in the Prometheus text format"""
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+def ingest_redirect():
+    """In a --workers viewer process: send ingest-side routes to the ingest process's admin port"""
+    if ingest_admin is None:
+        return None
+    return redirect(f"{ingest_admin}{request.full_path}", code=307)
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """Sampled ingest profile: POST ?seconds=30&rate=0.1 starts one, GET ?limit=30 reads it"""
+    moved = ingest_redirect()
+    if moved:
+        return moved
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': 'Profiling is only available from localhost'}), 403
+    if request.method == 'POST':
+        try:
+            seconds = float(request.args.get('seconds', 30))
+            rate = min(max(float(request.args.get('rate', 0.1)), 0.0), 1.0)
+        except ValueError:
+            return jsonify({'error': 'seconds and rate must be numbers'}), 400
+        profiler.start(seconds, rate)
+        log.info("🔬 Profiling %.0f%% of ingest calls for %.0fs", rate * 100, seconds)
+        return jsonify({'seconds': seconds, 'rate': rate})
+    limit = request.args.get('limit', 30, type=int)
+    return profiler.report(limit=limit), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: connected to the broker and at least one reading received"""
+    ready = readiness['mqtt_connected'] and readiness['first_reading'] is not None
+    return jsonify(dict(readiness, ready=ready)), 200 if ready else 503
+
+@app.route('/api/stats')
+def stats():
+    """Ingest vs broadcast counters"""
+    return ingest_redirect() or jsonify(coalescer.stats())
+
+@app.route('/api/taps')
+def tap_stats():
+    """Tap bursts: taps in vs events out, per-device tap rates"""
+    return ingest_redirect() or jsonify(taps.stats(time.time()))
+
+@app.route('/api/calibration')
+def calibration_api():
+    """Calibration profiles in use, ?device=..: that device's raw -> percent table"""
+    device = request.args.get('device')
+    if device is None:
+        return jsonify(calibration.describe())
+    table = calibration.get(device)
+    return jsonify({'device': device, 'profile': table.name, 'threshold': table.threshold, 'band': table.band,
+                    'percent': [round(p, 2) for p in table.percent.tolist()]})
+
+@app.route('/api/clients')
+def client_stats():
+    """Connection admission and the clients with messages waiting in their outbox, slowest first (?limit=N)"""
+    stats = client_manager.stats(limit=request.args.get('limit', 20, type=int))
+    stats['admission'] = connect_limiter.stats()
+    return jsonify(stats)
+
+def requested_devices(raw):
+    """Parse a device list (comma separated string or list) from a client"""
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    names = [str(name).strip() for name in raw or [] if str(name).strip()]
+    return list(dict.fromkeys(names))[:MAX_ROOMS_PER_CLIENT]
+
+def device_state(device):
+    """moisture_update payload with the current state of one device"""
+    state = devices.get(device)
+    value, alive = (state[0], state[1]) if state else (0, True)
+    return moisture_update(device, value, alive)
+
+# device -> ((value, alive, calibration version), encoded moisture_update), for devices in the table only
+snapshots = {}
+
+def snapshot_packets(server, device):
+    """Encoded moisture_update with a device's current state, serialized once per state change"""
+    state = devices.get(device)
+    if state is None:
+        return encode_event(server, 'moisture_update', device_state(device), '/')
+    key = (state[0], state[1], calibration.version)
+    cached = snapshots.get(device)
+    if cached is None or cached[0] != key:
+        update = moisture_update(device, state[0], state[1])
+        cached = snapshots[device] = (key, encode_event(server, 'moisture_update', update, '/'))
+    return cached[1]
+
+def admit_connection():
+    """Raise ConnectionRefusedError with a retry_after hint while connects come in too fast"""
+    retry_after = connect_limiter.admit()
+    if retry_after is not None:
+        connects['refused'].inc()
+        raise ConnectionRefusedError('server busy', {'retry_after': round(retry_after, 2)})
+    connects['admitted'].inc()
+
+def join_devices(names):
+    """Join the room of each device and send its current state"""
+    for device in names:
+        join_room(device)
+        client_manager.send_encoded(request.sid, '/', snapshot_packets(socketio.server, device))
+
+@app.route('/api/history')
+def history_api():
+    """Downsampled moisture history: ?device=..&from=..&to=..&points=N&method=lttb|minmax"""
+    device = request.args.get('device', DEFAULT_DEVICE)
+    method = request.args.get('method', 'lttb')
+    try:
+        end = float(request.args.get('to', time.time()))
+        start = float(request.args.get('from', end - 24 * 3600))
+        points = int(request.args.get('points', HISTORY_DEFAULT_POINTS))
+    except ValueError:
+        return jsonify({'error': 'from, to and points must be numbers'}), 400
+    if not (math.isfinite(start) and math.isfinite(end)):
+        return jsonify({'error': 'from and to must be finite numbers'}), 400
+    if method not in DOWNSAMPLE_METHODS:
+        return jsonify({'error': f"method must be one of {', '.join(DOWNSAMPLE_METHODS)}"}), 400
+    
+    series = history.query(device, start, end, max(3, min(points, HISTORY_MAX_POINTS)), method)
+    if series is None:
+        return jsonify({'error': f"No history for device {device}"}), 404
+    return jsonify(series)
 
 @socketio.on('connect')
 def handle_connect():
     """Handle new client connections"""
-    print(f"🔌 Client connected")
-    # Send current state to new client
-    moisture_percent = (current_moisture / 4095) * 100
-    emit('moisture_update', {
-        'value': current_moisture,
-        'percent': moisture_percent,
-        'alive': is_alive,
-        'changed': False
-    })
+    # Clients pick their vases with ?devices=a,b on the Socket.IO URL
+    admit_connection()
+    names = requested_devices(request.args.get('devices')) or [DEFAULT_DEVICE]
+    CONNECTED_CLIENTS.inc()
+    sampled_log.info('connect', "🔌 Client connected: %s", ', '.join(names), devices=names)
+    join_devices(names)
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Join additional device rooms after connecting"""
+    join_devices(requested_devices((data or {}).get('devices')))
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnections"""
-    print(f"🔌 Client disconnected")
+    CONNECTED_CLIENTS.dec()
+    sampled_log.info('disconnect', "🔌 Client disconnected")
 
 def open_browser():
     """Open browser after short delay"""
-    webbrowser.open('http://localhost:5000')
+    webbrowser.open(f'http://localhost:{HTTP_PORT}')
+
+def run_threading(headless=False, dev=False):
+    """Threading mode: paho's network thread emits through Flask-SocketIO
+    
+    Flask-SocketIO serves threading mode with Werkzeug's development server, which
+    it refuses outside debug unless told otherwise; dev=True (--dev) accepts that for
+    local use and the bench. Deployments use --mode async or --workers (uvicorn).
+    """
+    # Connect to MQTT in paho's thread, with backoff, while the HTTP server is already up
+    mqtt_client.connect_async(BROKER, PORT, 60)
+    mqtt_client.loop_start()
+    
+    # Flush coalesced moisture updates on a fixed tick
+    socketio.start_background_task(flush_updates)
+    socketio.start_background_task(flush_history)
+    
+    # Precompress model assets so the first page load doesn't pay for it
+    socketio.start_background_task(assets.warm)
+    
+    # Open browser after 1 second
+    if not headless:
+        Timer(1, open_browser).start()
+    
+    # Run Flask-SocketIO server
+    socketio.run(app, host=HOST, port=HTTP_PORT, debug=False, allow_unsafe_werkzeug=dev)
+
+def create_async_sio(transports=None):
+    """python-socketio AsyncServer with the viewer handlers, returns (sio, timed_emit)"""
+    from socketio import AsyncServer
+    
+    global client_manager
+    client_manager = AsyncOutboxManager(client_outboxes())
+    sio = AsyncServer(async_mode='asgi', cors_allowed_origins='*', transports=transports,
+                      client_manager=client_manager)
+    
+    async def timed_emit(event, data, room):
+        with emit_fanout[event].time():
+            await sio.emit(event, data, to=room)
+    
+    async def join(sid, names):
+        for device in names:
+            await sio.enter_room(sid, device)
+            await sio.manager.send_encoded(sid, '/', snapshot_packets(sio, device))
+    
+    @sio.event
+    async def connect(sid, environ):
+        admit_connection()
+        names = requested_devices(parse_qs(environ.get('QUERY_STRING', '')).get('devices', [''])[0]) or [DEFAULT_DEVICE]
+        CONNECTED_CLIENTS.inc()
+        sampled_log.info('connect', "🔌 Client connected: %s", ', '.join(names), devices=names)
+        await join(sid, names)
+    
+    @sio.event
+    async def subscribe(sid, data):
+        await join(sid, requested_devices((data or {}).get('devices')))
+    
+    @sio.event
+    async def disconnect(sid, *args):
+        CONNECTED_CLIENTS.dec()
+        sampled_log.info('disconnect', "🔌 Client disconnected")
+    
+    return sio, timed_emit
+
+async def serve_async(sio, sockets=None):
+    """Socket.IO plus the Flask routes (from uvicorn's thread pool) under uvicorn"""
+    import uvicorn
+    from asgiref.wsgi import WsgiToAsgi
+    from socketio import ASGIApp
+    
+    server = uvicorn.Server(uvicorn.Config(ASGIApp(sio, other_asgi_app=WsgiToAsgi(app)),
+                                           host=HOST, port=HTTP_PORT, log_level='warning'))
+    await server.serve(sockets=sockets)
+
+async def flush_updates_async(emit):
+    """Background task: hand the latest pending reading per sensor and the finished tap bursts to emit(event, data, room)"""
+    interval = 1.0 / UPDATE_FLUSH_HZ
+    while True:
+        await asyncio.sleep(interval)
+        for device, seq, update in coalescer.drain():
+            # No await between the check and emit() taking its turn, see run_async
+            if coalescer.current(device, seq):
+                await emit('moisture_update', update, device)
+        for device, burst in taps.drain(time.time()):
+            await emit('tap_event', burst, device)
+
+async def flush_history_async():
+    """Background task: push buffered history records to disk, off the loop"""
+    while True:
+        await asyncio.sleep(HISTORY_FLUSH_SECONDS)
+        await asyncio.to_thread(history.flush)
+
+def run_async(headless=False):
+    """Asyncio mode: MQTT reads, state updates and broadcasts share one event loop"""
+    from mqtt_asyncio import AsyncioMqtt
+    
+    sio, timed_emit = create_async_sio()
+    emitting = set()
+    order = None
+    
+    async def ordered_emit(event, data, room):
+        # One broadcast at a time, in the order they asked (asyncio.Lock is FIFO), so a flushed
+        # reading and an urgent transition for the same device can't interleave per client
+        async with order:
+            await timed_emit(event, data, room)
+    
+    def on_message(client, userdata, msg):
+        # Runs inside loop_read on the event loop thread, the emit is just another task
+        outgoing = ingest(msg.topic, msg.payload)
+        if outgoing:
+            task = asyncio.get_running_loop().create_task(ordered_emit(*outgoing))
+            emitting.add(task)
+            task.add_done_callback(emitting.discard)
+    
+    async def main():
+        nonlocal order
+        order = asyncio.Lock()
+        mqtt_client.on_message = on_message
+        tasks = [
+            asyncio.create_task(AsyncioMqtt(mqtt_client).run(BROKER, PORT, 60)),
+            asyncio.create_task(flush_updates_async(ordered_emit)),
+            asyncio.create_task(flush_history_async()),
+            asyncio.create_task(asyncio.to_thread(assets.warm)),
+        ]
+        if not headless:
+            asyncio.get_running_loop().call_later(1, open_browser)
+        try:
+            await serve_async(sio)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    asyncio.run(main())
+
+def run_workers(count, log_format="plain", log_level="INFO", headless=False, options=None):
+    """Multi-process mode: one MQTT subscription here, viewers served by count worker processes"""
+    import multiprocessing
+    from werkzeug.serving import make_server
+    from mqtt_asyncio import AsyncioMqtt
+    from bus import BusServer
+    
+    global devices, readiness_listener
+    devices = SharedDeviceTable(capacity=MAX_DEVICES)
+    bus = BusServer(BUS_PATH)
+    # Workers answer /readyz, they learn the ingest state over the bus
+    readiness_listener = bus.set_state
+    spawn = multiprocessing.get_context('spawn')
+    
+    def on_message(client, userdata, msg):
+        outgoing = ingest(msg.topic, msg.payload)
+        if outgoing:
+            bus.publish(*outgoing)
+    
+    async def publish(event, data, room):
+        bus.publish(event, data, room)
+    
+    def start_worker(index):
+        worker = spawn.Process(target=run_worker, args=(index, devices.name, log_format, log_level, options),
+                               name=f"plant-worker-{index}", daemon=True)
+        worker.start()
+        return worker
+    
+    async def supervise(workers):
+        """Restart workers that exit"""
+        while True:
+            await asyncio.sleep(WORKER_RESTART_SECONDS)
+            for index, worker in enumerate(workers):
+                if not worker.is_alive():
+                    log.warning("⚠️ Worker %d exited (code %s), restarting", index, worker.exitcode)
+                    workers[index] = start_worker(index)
+    
+    async def main():
+        # Stop the workers and free the shared table on SIGTERM too, not only on Ctrl-C
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        await bus.start()
+        # Ingest metrics, /api/stats, /api/taps and /debug/profile live in this process
+        admin = make_server(ADMIN_HOST, ADMIN_PORT, app, threaded=True)
+        threading.Thread(target=admin.serve_forever, name="plant-admin", daemon=True).start()
+        workers = [start_worker(index) for index in range(count)]
+        log.info("👷 %d workers serving port %d, bus at %s, ingest admin at http://%s:%d",
+                 count, HTTP_PORT, BUS_PATH, ADMIN_HOST, ADMIN_PORT)
+        mqtt_client.on_message = on_message
+        tasks = [
+            asyncio.create_task(AsyncioMqtt(mqtt_client).run(BROKER, PORT, 60)),
+            asyncio.create_task(flush_updates_async(publish)),
+            asyncio.create_task(flush_history_async()),
+            asyncio.create_task(asyncio.to_thread(assets.warm)),
+        ]
+        if not headless:
+            asyncio.get_running_loop().call_later(1, open_browser)
+        try:
+            await supervise(workers)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for worker in workers:
+                worker.terminate()
+            admin.shutdown()
+            await bus.close()
+    
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        history.flush()
+        devices.close()
+
+def run_worker(index, table_name, log_format, log_level, options=None):
+    """Worker process: its share of the viewers, snapshots from the shared device table"""
+    from bus import subscribe, STATE_EVENT
+    
+    global devices, SOCKET_TRANSPORTS, ingest_admin
+    setup_logging(log_format, log_level)
+    # Spawned processes import this module without running __main__, so the overrides come along
+    apply_options(options or {})
+    ingest_admin = f"http://{ADMIN_HOST}:{ADMIN_PORT}"
+    devices = SharedDeviceTable(capacity=MAX_DEVICES, name=table_name)
+    # Workers share the port, so a polling session could land on another worker
+    SOCKET_TRANSPORTS = ['websocket']
+    sio, timed_emit = create_async_sio(transports=SOCKET_TRANSPORTS)
+    
+    async def relay():
+        # In order, so a slow fan-out holds back the bus instead of piling up tasks
+        async for event, data, room in subscribe(BUS_PATH):
+            if event == STATE_EVENT:
+                readiness.update(data)
+                continue
+            await timed_emit(event, data, room)
+    
+    async def main():
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        listener.bind((HOST, HTTP_PORT))
+        relaying = asyncio.create_task(relay())
+        try:
+            await serve_async(sio, sockets=[listener])
+        finally:
+            relaying.cancel()
+    
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+def apply_options(options):
+    """Command line overrides of the filter, calibration, tap window and log sampling"""
+    if options.get('log_sample') is not None:
+        sampled_log.per_second = options['log_sample']
+    if options.get('tap_window') is not None:
+        taps.window = options['tap_window']
+    for key, option in (('method', 'filter'), ('window', 'filter_window'), ('alpha', 'filter_alpha')):
+        if options.get(option) is not None:
+            filters.default[key] = options[option]
+    if options.get('hysteresis') is not None:
+        calibration.default_profile = linear_profile(MOISTURE_THRESHOLD, options['hysteresis'])
+        calibration.load()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plant Guardian Web Viewer")
+    parser.add_argument("--mode", choices=("threading", "async"), default="threading",
+                        help="threading: Flask-SocketIO + paho thread, async: one asyncio event loop")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="serve viewers from N async worker processes fed by this one (Linux)")
+    parser.add_argument("--headless", action="store_true", help="don't open a browser (servers, supervisors)")
+    parser.add_argument("--dev", action="store_true",
+                        help="threading mode: run on Werkzeug's development server (local use, bench)")
+    parser.add_argument("--filter", choices=FILTER_METHODS, help=f"moisture filter (default {filters.default['method']})")
+    parser.add_argument("--filter-window", type=int, help="readings in the rolling median")
+    parser.add_argument("--filter-alpha", type=float, help="EMA weight of a new reading")
+    parser.add_argument("--hysteresis", type=int,
+                        help="band around the threshold before alive/dead flips, raw units of the default calibration")
+    parser.add_argument("--tap-window", type=float, default=TAP_WINDOW_SECONDS,
+                        help="seconds of quiet that end a tap burst (0 sends every tap on the next flush tick)")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default="plain",
+                        help="plain: console lines, json: one structured object per line")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG also logs every emit")
+    parser.add_argument("--log-sample", type=int, default=DEFAULT_SAMPLE_PER_SECOND,
+                        help="per-message log lines per second and kind (transitions are always logged)")
+    args = parser.parse_args()
+    if args.mode == "threading" and not args.workers and not args.dev:
+        parser.error("threading mode runs on Werkzeug's development server: pass --dev for local use, "
+                     "or serve with --mode async / --workers")
+    
+    setup_logging(args.log_format, args.log_level.upper())
+    options = {key: getattr(args, key) for key in
+               ('log_sample', 'tap_window', 'filter', 'filter_window', 'filter_alpha', 'hysteresis')}
+    apply_options(options)
+    
     print("\n" + "="*50)
     print("🌱 Plant Guardian Web Viewer")
     print("="*50)
-    print("🌐 Starting at: http://localhost:5000")
+    print(f"🌐 Starting at: http://localhost:{HTTP_PORT}")
+    print(f"⚙️  Mode: {f'{args.workers} workers' if args.workers else args.mode}")
     print(f"📡 MQTT Broker: {BROKER}:{PORT}")
     print(f"📡 MQTT Topic: {TOPIC}")
-    print(f"💧 Moisture Threshold: {MOISTURE_THRESHOLD} (50%)")
+    print(f"💧 Moisture Threshold: {calibration.default.threshold:.1f}% ±{calibration.default.band:.1f} "
+          f"({len(calibration.describe()['devices'])} devices calibrated in {CALIBRATION_CONFIG.name})")
+    print(f"🧹 Filter: {filters.default['method']}")
+    print(f"⏱️  Update Flush Rate: {UPDATE_FLUSH_HZ} Hz")
+    print(f"💥 Tap Burst Window: {taps.window:g}s")
     print("="*50)
     print("\n🌿 Waiting for sensor data...")
     
-    # Connect to MQTT broker
-    try:
-        mqtt_client.connect(BROKER, PORT, 60)
-        mqtt_client.loop_start()
-        print("✅ MQTT client started")
-    except Exception as e:
-        print(f"❌ MQTT connection error: {e}")
-    
-    # Open browser after 1 second
-    Timer(1, open_browser).start()
-    
-    # Run Flask-SocketIO server
-    socketio.run(app, host='0.0.0.0', port=5000, debug=False)
+    if args.workers:
+        run_workers(args.workers, args.log_format, args.log_level.upper(), args.headless, options)
+    elif args.mode == "async":
+        run_async(args.headless)
+    else:
+        run_threading(args.headless, args.dev)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Shared Animation Library
+
+Moves the clips of every character onto one shared Mixamo rig so the
+viewer downloads them once and a character switch only fetches the new
+mesh and textures:
+- The primary (idle) clips stay in the character's glTF, so it animates
+  as soon as it loads
+- Each clip becomes a chunk in web_assets/library/ (the clip_splitter
+  layout), named by its content hash, so identical clips are stored once
+  and can be cached forever
+- Tracks are addressed by bone name and stored relative to the source
+  character's rest pose (rotation: rest^-1 * q, translation: offset from
+  rest, scale: ratio to rest). The viewer re-applies the rest pose of
+  whichever character it binds them to, so clips play on any rig with
+  the same bone names despite different proportions
+- library/<character>.json lists that character's clips and bones
+- Identical clips share one chunk by content hash. A character can also
+  opt in to play another character's chunk for a clip ("shared_clips":
+  {"die": "npc"} in characters.json): share_clips() points its entry at
+  that chunk, applied to the bones they have in common, and keeps its
+  own chunk as "own"
+
+Usage: python shared_library.py web_assets/npc.gltf web_assets/zombie.gltf
+       [--manifest characters.json] [--prune]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import struct
+from pathlib import Path
+from clip_splitter import CLIP_MAGIC, DEFAULT_PRIMARY_CLIPS, clip_key, splittable
+from gltf_tools import Gltf
+
+LIBRARY_DIR_NAME = "library"
+CLIP_HASH_LENGTH = 16
+
+# Relative keys closer than this to their first key count as constant
+CONSTANT_TOLERANCE = 1e-5
+
+SHORT = 5122
+FLOAT = 5126
+
+
+def library_dir(gltf_path):
+    """Shared library directory next to a character's glTF"""
+    return Path(gltf_path).with_name(LIBRARY_DIR_NAME)
+
+
+def _conjugate(q):
+    return (-q[0], -q[1], -q[2], q[3])
+
+
+def _multiply(a, b):
+    ax, ay, az, aw = a
+    bx, by, bz, bw = b
+    return (aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+            aw * bw - ax * bx - ay * by - az * bz)
+
+
+def _relative_keys(path, values, rest):
+    """Keys of one track relative to the bone's rest pose, flat"""
+    if path == 'rotation':
+        inverse = _conjugate(rest)
+        keys = [_multiply(inverse, tuple(values[i:i + 4])) for i in range(0, len(values), 4)]
+        # Same hemisphere as the identity so the viewer's slerp stays short
+        return [c for key in keys for c in (key if key[3] >= 0 else tuple(-v for v in key))]
+    if path == 'translation':
+        return [v - rest[i % 3] for i, v in enumerate(values)]
+    if path == 'scale':
+        return [v / rest[i % 3] if rest[i % 3] else v for i, v in enumerate(values)]
+    return list(values)
+
+
+# Fields of a library clip that describe its chunk
+CLIP_FIELDS = ('file', 'bytes', 'duration', 'animation')
+
+REST_DEFAULTS = {'rotation': [0.0, 0.0, 0.0, 1.0], 'translation': [0.0, 0.0, 0.0], 'scale': [1.0, 1.0, 1.0]}
+IDENTITY = {'rotation': (0.0, 0.0, 0.0, 1.0), 'translation': (0.0, 0.0, 0.0), 'scale': (1.0, 1.0, 1.0)}
+
+
+def _constant(values, components):
+    return all(abs(v - values[i % components]) <= CONSTANT_TOLERANCE for i, v in enumerate(values))
+
+
+def encode_relative_clip(gltf, animation):
+    """Serialize one animation as a rest-relative chunk, returns (bytes, duration)"""
+    nodes = gltf.json['nodes']
+    tracks, data, duration = [], bytearray(), 0.0
+
+    def append(raw):
+        data.extend(b'\0' * (-len(data) % 4))
+        offset = len(data)
+        data.extend(raw)
+        return offset
+
+    shared_inputs = {}
+    for channel in animation['channels']:
+        sampler = animation['samplers'][channel['sampler']]
+        path = channel['target']['path']
+        node = nodes[channel['target']['node']]
+        times = gltf.accessors[sampler['input']]
+        values, _ = gltf.read_accessor(sampler['output'])
+        duration = max(duration, times.get('max', [0.0])[0])
+        input_key, count = sampler['input'], times['count']
+        if path in REST_DEFAULTS:
+            values = _relative_keys(path, values, node.get(path, REST_DEFAULTS[path]))
+            components = len(values) // count
+            if _constant(values, components):
+                # A track that holds the rest pose changes nothing on any rig
+                if all(abs(a - b) <= CONSTANT_TOLERANCE for a, b in zip(values, IDENTITY[path])):
+                    continue
+                values, input_key, count = values[:components], ('first', sampler['input']), 1
+        if input_key not in shared_inputs:
+            raw = gltf.accessor_bytes(sampler['input'])
+            shared_inputs[input_key] = append(raw[:4] if count == 1 else raw)
+
+        if path == 'rotation':
+            component_type = SHORT
+            packed = struct.pack(f'<{len(values)}h', *(round(max(-1.0, min(1.0, v)) * 32767) for v in values))
+        else:
+            component_type = FLOAT
+            packed = struct.pack(f'<{len(values)}f', *values)
+        track = {
+            'node': node['name'],
+            'path': path,
+            'interpolation': sampler.get('interpolation', 'LINEAR'),
+            'input': {'offset': shared_inputs[input_key], 'count': count},
+            'output': {
+                'offset': append(packed),
+                'count': len(values),
+                'componentType': component_type,
+                'normalized': component_type == SHORT,
+            },
+        }
+        if path == 'translation':
+            # Offsets scale with the bone, the viewer multiplies by its own rest length over this one
+            track['restLength'] = math.sqrt(sum(c * c for c in node.get('translation', [0.0, 0.0, 0.0])))
+        tracks.append(track)
+
+    header = json.dumps({'name': animation.get('name', ''), 'duration': duration, 'relative': True,
+                         'tracks': tracks}, separators=(',', ':')).encode()
+    header += b' ' * (-len(header) % 4)
+    return CLIP_MAGIC + struct.pack('<I', len(header)) + header + bytes(data), duration
+
+
+def _bones(gltf):
+    """Bone name -> parent bone name (None for the root) over every skin"""
+    nodes = gltf.json.get('nodes', [])
+    parents = {child: index for index, node in enumerate(nodes) for child in node.get('children', [])}
+    joints = {joint for skin in gltf.json.get('skins', []) for joint in skin['joints']}
+    return {nodes[joint]['name']: nodes[parents[joint]]['name'] if parents.get(joint) in joints else None
+            for joint in sorted(joints) if 'name' in nodes[joint]}
+
+
+def add_to_library(gltf_path, out_dir=None, primary_clips=DEFAULT_PRIMARY_CLIPS):
+    """Move a character's non-primary clips into the shared library, returns its library entry
+
+    A glTF whose clips were already moved keeps its existing entry."""
+    gltf_path = Path(gltf_path)
+    out_dir = Path(out_dir) if out_dir else library_dir(gltf_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    entry_path = out_dir / f"{gltf_path.stem}.json"
+    gltf = Gltf(gltf_path)
+
+    names = [node.get('name') for node in gltf.json.get('nodes', [])]
+    unique_names = {name for name in names if name and names.count(name) == 1}
+    kept, clips = [], []
+    for animation in gltf.json.get('animations', []):
+        # Rest-relative keys need TRS rest poses
+        posed = any('matrix' in gltf.json['nodes'][channel['target']['node']] for channel in animation['channels'])
+        if clip_key(animation.get('name', '')) in primary_clips or posed or not splittable(gltf, animation, unique_names):
+            kept.append(animation)
+            continue
+        chunk, duration = encode_relative_clip(gltf, animation)
+        filename = hashlib.sha256(chunk).hexdigest()[:CLIP_HASH_LENGTH] + ".bin"
+        target = out_dir / filename
+        if not target.exists():
+            # Several exporters may write the same clip at once
+            tmp = target.with_suffix(f".tmp{os.getpid()}")
+            tmp.write_bytes(chunk)
+            tmp.replace(target)
+        clips.append({'name': clip_key(animation.get('name', '')), 'animation': animation.get('name', ''),
+                      'file': filename, 'bytes': len(chunk), 'duration': duration})
+
+    if not clips and entry_path.is_file():
+        return json.loads(entry_path.read_text())
+
+    if kept:
+        gltf.json['animations'] = kept
+    else:
+        gltf.json.pop('animations', None)
+    gltf.save(gltf_path, binary_name=gltf.json['buffers'][0].get('uri') if gltf.json.get('buffers') else None)
+
+    entry = {
+        'model': gltf_path.stem,
+        'primary': [clip_key(animation.get('name', '')) for animation in kept],
+        'clips': clips,
+        'bones': _bones(gltf),
+    }
+    entry_path.write_text(json.dumps(entry, indent=1))
+    return entry
+
+
+def share_clips(out_dir, shared=None):
+    """Point opted-in clips at another character's chunk, returns how many entries changed
+
+    shared: {model: {clip name: owner model}}, from "shared_clips" in
+    characters.json. Every other clip plays the character's own chunk
+    (identical clips already share one, chunks are named by content), so
+    the per-character animation mapping is never overridden by a name
+    match. Clips no longer listed go back to their own chunk."""
+    out_dir = Path(out_dir)
+    shared = shared or {}
+    paths = {path.stem: path for path in out_dir.glob("*.json")}
+    entries = {model: json.loads(path.read_text()) for model, path in paths.items()}
+
+    def own(clip):
+        return clip.get('own', {key: clip[key] for key in CLIP_FIELDS})
+
+    changed = 0
+    for model, entry in entries.items():
+        for clip in entry['clips']:
+            owner = shared.get(model, {}).get(clip['name'])
+            source = None
+            if owner and owner != model:
+                source = next((c for c in entries.get(owner, {'clips': []})['clips'] if c['name'] == clip['name']), None)
+                if source is None:
+                    raise ValueError(f"{model}: shared clip {clip['name']!r} not found in {owner}'s library entry")
+            if source is None:
+                clip.update(own(clip))
+                clip.pop('own', None)
+                clip.pop('sharedFrom', None)
+            else:
+                clip['own'] = own(clip)
+                clip.update(own(source))
+                clip['sharedFrom'] = owner
+        text = json.dumps(entry, indent=1)
+        if text != paths[model].read_text():
+            paths[model].write_text(text)
+            changed += 1
+    return changed
+
+
+def prune_library(out_dir):
+    """Delete clip chunks no character entry references, returns how many"""
+    out_dir = Path(out_dir)
+    used = set()
+    for entry_path in out_dir.glob("*.json"):
+        for clip in json.loads(entry_path.read_text())['clips']:
+            used.update((clip['file'], clip.get('own', clip)['file']))
+    stale = [path for path in out_dir.glob("*.bin") if path.name not in used]
+    for path in stale:
+        path.unlink()
+    return len(stale)
+
+
+def print_library(out_dir):
+    """Clips per character, chunks shared between characters and the bones they all have"""
+    entries = [json.loads(path.read_text()) for path in sorted(Path(out_dir).glob("*.json"))]
+    owners = {}
+    for entry in entries:
+        for clip in entry['clips']:
+            owners.setdefault(clip['file'], set()).add(entry['model'])
+    # What the viewer downloads: the chunks entries point at, not the "own" chunks kept for re-sharing
+    total = sum((Path(out_dir) / file).stat().st_size for file in owners if (Path(out_dir) / file).exists())
+    print(f"📚 Shared library {out_dir}: {len(owners)} clips, {total:,} bytes")
+    for entry in entries:
+        shared = sum(len(owners[clip['file']]) > 1 for clip in entry['clips'])
+        print(f"   {entry['model']}: {', '.join(clip['name'] for clip in entry['clips']) or '-'} "
+              f"({len(entry['bones'])} bones, {shared} clips shared)")
+    if len(entries) > 1:
+        common = set.intersection(*(set(entry['bones']) for entry in entries))
+        print(f"   bones common to all characters: {len(common)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move character clips into a shared, rig-relative library")
+    parser.add_argument("gltf", nargs="+", help="character glTF files sharing one rig")
+    parser.add_argument("--manifest", help="characters.json whose \"shared_clips\" opt clips in to another character's chunk")
+    parser.add_argument("--prune", action="store_true", help="delete chunks no character uses anymore")
+    args = parser.parse_args()
+
+    out_dir = library_dir(args.gltf[0])
+    for path in args.gltf:
+        add_to_library(path, out_dir)
+    shared = {}
+    if args.manifest:
+        characters = json.loads(Path(args.manifest).read_text())['characters']
+        shared = {name: character.get('shared_clips', {}) for name, character in characters.items()}
+    share_clips(out_dir, shared)
+    if args.prune:
+        print(f"🧹 Removed {prune_library(out_dir)} unused chunks")
+    print_library(out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Tap Burst Aggregation
+
+Sits between MQTT ingest and the tap_event broadcast, like the moisture
+coalescer:
+- Taps on one device are collected into a burst until the device has
+  been quiet for `window` seconds (or the burst is `max_burst` seconds
+  long), then the whole burst goes out as one event with its count and
+  first/last timestamps
+- Per-device statistics: taps, bursts, largest burst and an
+  exponentially decaying tap rate
+"""
+import math
+import threading
+
+DEFAULT_WINDOW = 0.3
+DEFAULT_MAX_BURST = 2.0
+RATE_TIME_CONSTANT = 60.0
+
+
+class TapStats:
+    __slots__ = ('taps', 'bursts', 'largest_burst', 'last', 'rate')
+
+    def __init__(self):
+        self.taps = 0
+        self.bursts = 0
+        self.largest_burst = 0
+        self.last = None
+        self.rate = 0.0  # taps per second, decayed to self.last
+
+
+class TapAggregator:
+    def __init__(self, window=DEFAULT_WINDOW, max_burst=DEFAULT_MAX_BURST, capacity=1024):
+        self.window = window
+        self.max_burst = max_burst
+        self.capacity = capacity
+        self._bursts = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.received = 0
+        self.emitted = 0
+
+    def offer(self, device, data, now):
+        """Add one tap to the device's open burst"""
+        with self._lock:
+            self.received += 1
+            burst = self._bursts.get(device)
+            if burst is None:
+                self._bursts[device] = {'device': device, 'data': data, 'count': 1, 'first': now, 'last': now}
+            else:
+                burst['data'] = data
+                burst['count'] += 1
+                burst['last'] = now
+            stats = self._stats.get(device)
+            if stats is None and len(self._stats) < self.capacity:
+                stats = self._stats[device] = TapStats()
+            if stats is not None:
+                if stats.last is not None:
+                    stats.rate *= math.exp(-max(now - stats.last, 0.0) / RATE_TIME_CONSTANT)
+                stats.rate += 1.0 / RATE_TIME_CONSTANT
+                stats.last = now
+                stats.taps += 1
+
+    def drain(self, now):
+        """Take every burst that is over, returns a list of (device, tap_event payload)"""
+        with self._lock:
+            done = [device for device, burst in self._bursts.items()
+                    if now - burst['last'] >= self.window or now - burst['first'] >= self.max_burst]
+            bursts = [(device, self._bursts.pop(device)) for device in done]
+            self.emitted += len(bursts)
+            for device, burst in bursts:
+                stats = self._stats.get(device)
+                if stats is not None:
+                    stats.bursts += 1
+                    stats.largest_burst = max(stats.largest_burst, burst['count'])
+        return bursts
+
+    def stats(self, now):
+        """Totals and per-device tap statistics, rates decayed to now"""
+        with self._lock:
+            devices = {
+                device: {
+                    'taps': stats.taps,
+                    'bursts': stats.bursts,
+                    'largest_burst': stats.largest_burst,
+                    'last': stats.last,
+                    'taps_per_minute': 60 * stats.rate * math.exp(-max(now - stats.last, 0.0) / RATE_TIME_CONSTANT),
+                }
+                for device, stats in self._stats.items()
+            }
+            received, emitted, pending = self.received, self.emitted, len(self._bursts)
+        return {
+            'received': received,
+            'emitted': emitted,
+            'pending': pending,
+            'window': self.window,
+            'devices': devices,
+        }
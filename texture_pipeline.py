@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Texture Pipeline
+
+Builds lighter variants of every image a character glTF references:
+- Power-of-two mip chain (full size down to MIN_TEXTURE_SIZE) as WebP and PNG
+- KTX2 (UASTC + mipmaps) when the `toktx` tool is installed
+- Rewrites the glTF image URIs to textures/<name>, the server then picks
+  the variant that fits the client (Accept header, quality cookie)
+- Reports bytes and decode time of each variant against the original
+
+Usage: python texture_pipeline.py web_assets/zombie.gltf [more.gltf ...]
+"""
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+TEXTURE_DIR = "textures"
+MANIFEST_NAME = "manifest.json"
+MIN_TEXTURE_SIZE = 256
+WEBP_QUALITY = 85
+
+# Largest edge served per quality level
+QUALITY_LEVELS = {"high": 4096, "medium": 1024, "low": 512}
+DEFAULT_QUALITY = "high"
+
+# Preference order when the client accepts several formats
+FORMAT_MIMETYPES = {"ktx2": "image/ktx2", "webp": "image/webp", "png": "image/png"}
+
+
+def decode_ms(path, runs=3):
+    """Median time to fully decode an image with Pillow, in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        with Image.open(path) as image:
+            image.load()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def mip_sizes(width, height):
+    """Power-of-two edge lengths from the image size down to MIN_TEXTURE_SIZE"""
+    size = 1
+    while size * 2 <= max(width, height):
+        size *= 2
+    sizes = []
+    while size >= MIN_TEXTURE_SIZE:
+        sizes.append(size)
+        size //= 2
+    return sizes or [max(width, height)]
+
+
+def build_texture(source, out_dir):
+    """Write every variant of one image, returns its manifest entry"""
+    stem = source.stem
+    entry = {'source': source.name, 'bytes': source.stat().st_size, 'variants': []}
+    entry['decode_ms'] = decode_ms(source)
+    with Image.open(source) as image:
+        entry['width'], entry['height'] = image.size
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        for size in mip_sizes(*image.size):
+            scale = size / max(image.size)
+            resized = image if scale == 1 else image.resize(
+                (max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+            for fmt, options in (("webp", {'quality': WEBP_QUALITY, 'method': 6}), ("png", {'optimize': True})):
+                path = out_dir / f"{stem}-{size}.{fmt}"
+                resized.save(path, fmt.upper(), **options)
+                entry['variants'].append({'format': fmt, 'size': size, 'file': path.name})
+
+    toktx = shutil.which("toktx")
+    if toktx:
+        path = out_dir / f"{stem}.ktx2"
+        result = subprocess.run([toktx, "--t2", "--encode", "uastc", "--genmipmap", str(path), str(source)],
+                                capture_output=True, text=True)
+        if result.returncode == 0:
+            entry['variants'].append({'format': 'ktx2', 'size': max(entry['width'], entry['height']),
+                                      'file': path.name})
+        else:
+            print(f"⚠️  toktx failed for {source.name}: {result.stderr.strip()}")
+
+    for variant in entry['variants']:
+        path = out_dir / variant['file']
+        variant['bytes'] = path.stat().st_size
+        # Pillow can't decode KTX2, its cost is a GPU upload rather than a decode
+        variant['decode_ms'] = decode_ms(path) if variant['format'] != 'ktx2' else None
+    return entry
+
+
+def process_gltf(gltf_path):
+    """Build variants for the images of one glTF and point it at them"""
+    gltf_path = Path(gltf_path)
+    assets_dir = gltf_path.parent
+    out_dir = assets_dir / TEXTURE_DIR
+    out_dir.mkdir(exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    document = json.loads(gltf_path.read_text())
+    for image in document.get('images', []):
+        uri = image.get('uri', '')
+        if uri.startswith('data:') or uri.startswith(f"{TEXTURE_DIR}/"):
+            continue
+        source = assets_dir / uri
+        if not source.exists():
+            print(f"⚠️  {gltf_path.name}: image not found: {uri}")
+            continue
+        manifest[source.stem] = build_texture(source, out_dir)
+        print_texture_report(manifest[source.stem])
+        # The served format varies per client, so the URI has no extension
+        image['uri'] = f"{TEXTURE_DIR}/{source.stem}"
+        image.pop('mimeType', None)
+
+    gltf_path.write_text(json.dumps(document, separators=(',', ':')))
+    manifest_path.write_text(json.dumps(manifest, indent=1))
+    return manifest
+
+
+def print_texture_report(entry):
+    """Bytes and decode time of each variant vs the original"""
+    print(f"🖼️  {entry['source']}: {entry['width']}x{entry['height']}, "
+          f"{entry['bytes']:,} bytes, decode {entry['decode_ms']:.1f} ms")
+    for variant in entry['variants']:
+        change = variant['bytes'] / entry['bytes'] - 1
+        decode = f"decode {variant['decode_ms']:.1f} ms" if variant['decode_ms'] is not None else "GPU upload"
+        print(f"   {variant['file']:<36} {variant['bytes']:>10,} bytes ({change:+.0%})  {decode}")
+
+
+class TextureCatalog:
+    """Server side: picks the best variant of a texture for one request"""
+
+    def __init__(self, assets_dir):
+        self.manifest_path = Path(assets_dir) / TEXTURE_DIR / MANIFEST_NAME
+        self._manifest = {}
+        self._mtime = None
+
+    def manifest(self):
+        """Texture manifest, reloaded when the pipeline rewrites it"""
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except OSError:
+            return {}
+        if mtime != self._mtime:
+            self._manifest = json.loads(self.manifest_path.read_text())
+            self._mtime = mtime
+        return self._manifest
+
+    def pick(self, name, accepted_formats, quality=DEFAULT_QUALITY):
+        """File name of the largest variant within the quality level, in the best accepted format"""
+        entry = self.manifest().get(name)
+        if entry is None:
+            return None
+        max_size = QUALITY_LEVELS.get(quality, QUALITY_LEVELS[DEFAULT_QUALITY])
+        for fmt in FORMAT_MIMETYPES:
+            if fmt not in accepted_formats:
+                continue
+            variants = [v for v in entry['variants'] if v['format'] == fmt and v['size'] <= max_size]
+            if not variants and fmt != 'ktx2':
+                # Quality level below the smallest mip: use the smallest one
+                variants = sorted((v for v in entry['variants'] if v['format'] == fmt), key=lambda v: v['size'])[:1]
+            if variants:
+                return max(variants, key=lambda v: v['size'])['file']
+        return None
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    if Image is None:
+        print("❌ Pillow is required: pip install pillow")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        print(f"📦 {path}")
+        process_gltf(path)
+
+
+if __name__ == "__main__":
+    main()